@@ -1,10 +1,17 @@
 import tkinter as tk
 from tkinter import filedialog
-import librosa
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
+# Figure rather than pyplot: the canvas is embedded in Tk, so no pyplot backend setup is needed
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+import instrumentation
+import pop_detection
+import startup
+from audio_cache import AudioCache
+from threshold_index import ThresholdIndex
+from waveform_pyramid import PeakPyramid, plot_envelope, plot_pop_markers
+
 class AudioPopDetector:
     def __init__(self, root):
         self.root = root
@@ -34,8 +41,17 @@ class AudioPopDetector:
         self.threshold_label.grid(row=1, column=0, padx=10)
         self.threshold_scale = tk.Scale(self.controls_frame, from_=0, to=1, resolution=0.01, orient="horizontal", length=300)
         self.threshold_scale.set(0.4)
+        self.threshold_scale.config(command=self.on_threshold_change)
         self.threshold_scale.grid(row=1, column=1, padx=10)
 
+        # Detection mode: raw amplitude or spectral transient score
+        self.mode_label = tk.Label(self.controls_frame, text="Detection Mode")
+        self.mode_label.grid(row=2, column=0, padx=10)
+        self.mode_var = tk.StringVar(value=pop_detection.DEFAULT_MODE)
+        self.mode_menu = tk.OptionMenu(self.controls_frame, self.mode_var, *pop_detection.DETECTION_MODES,
+                                       command=self.on_mode_change)
+        self.mode_menu.grid(row=2, column=1, padx=10, sticky="w")
+
         # Frame for additional info
         self.info_frame = tk.Frame(self.root)
         self.info_frame.pack(pady=10)
@@ -57,24 +73,36 @@ class AudioPopDetector:
         self.file_name_label.pack()
 
         # Canvas for matplotlib graph
-        self.figure, self.ax = plt.subplots(figsize=(10, 4))
+        self.figure = Figure(figsize=(10, 4))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.figure, master=self.root)
         self.canvas.get_tk_widget().pack()
 
+        # Decoded audio is cached on disk so reloading a file skips decoding
+        self.audio_cache = AudioCache()
+
         # Variables for audio data
         self.y = None
         self.sr = None
         self.file_path = None
+        self.peak_pyramid = None
+        self.threshold_index = None
 
     def load_audio(self):
         # Load audio file using a file dialog
         self.file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3 *.m4a")])
         if self.file_path:
-            # Load the audio file using librosa
-            self.y, self.sr = librosa.load(self.file_path, sr=None)
+            # Load the audio file using the detection engine; every channel
+            # is kept and analyzed separately instead of a mono downmix
+            self.y, self.sr = pop_detection.load_audio(self.file_path, sr=None, cache=self.audio_cache, mono=False)
+
+            # Precompute the min/max envelope used for plotting and the
+            # per-block peaks that answer any threshold without a full scan
+            self.peak_pyramid = PeakPyramid(self.y)
+            self.threshold_index = ThresholdIndex(self.y, self.sr)
 
             # Update info labels
-            duration = librosa.get_duration(y=self.y, sr=self.sr)
+            duration = len(self.y) / self.sr
             self.audio_duration_label.config(text=f"Duration: {duration:.2f} seconds")
             self.sampling_rate_label.config(text=f"Sampling Rate: {self.sr} Hz")
             self.file_name_label.config(text=f"File Name: {self.file_path.split('/')[-1]}")  # Display only the filename
@@ -83,62 +111,83 @@ class AudioPopDetector:
             self.plot_waveform()
 
     def plot_waveform(self):
-        # Plot the audio waveform
+        # Plot the audio waveform at the resolution of the screen
         if self.y is not None:
-            self.ax.clear()
-            times = np.arange(len(self.y)) / self.sr
-            self.ax.plot(times, self.y, label='Audio Waveform')
-            self.ax.set_xlabel('Time (s)')
-            self.ax.set_ylabel('Amplitude')
-            self.ax.set_title('Audio Amplitude Over Time')
-            self.ax.legend()
-            self.canvas.draw()
+            with instrumentation.span("plot"):
+                self.ax.clear()
+                plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
+                self.ax.set_xlabel('Time (s)')
+                self.ax.set_ylabel('Amplitude')
+                self.ax.set_title('Audio Amplitude Over Time')
+                self.ax.legend()
+                self.canvas.draw()
+
+    def plot_width(self):
+        # Width of the plot in pixels, used to pick the waveform envelope resolution
+        width = self.canvas.get_tk_widget().winfo_width()
+        return width if width > 1 else 1000
+
+    def on_mode_change(self, mode):
+        # The slider gates the transient score (0-1) instead of the amplitude in spectral mode
+        self.threshold_label.config(text="Transient Threshold" if mode == "spectral" else "Amplitude Threshold")
+
+    def on_threshold_change(self, value):
+        # Live pop count while the slider moves (rescans only the loud blocks)
+        if self.threshold_index is not None and self.mode_var.get() == "amplitude":
+            count = self.threshold_index.count(float(value))
+            self.pop_count_label.config(text=f"Detected Pops: {count}")
 
     def detect_pop_sound(self):
         if self.y is not None:
             # Get the amplitude threshold value from the scale
             threshold = self.threshold_scale.get()
 
-            # Detect and highlight pop sounds based on amplitude
-            self.highlight_pop_sounds(threshold)
+            # Detect and highlight pop sounds with the selected detector
+            self.highlight_pop_sounds(threshold, self.mode_var.get())
 
-    def highlight_pop_sounds(self, threshold):
-        # Perform pop sound detection based on amplitude threshold
-        times = np.arange(len(self.y)) / self.sr
-        pop_indices = np.where(np.abs(self.y) > threshold)[0]
-        pop_times = times[pop_indices]
-
-        # Group pop times by 0.5-second intervals
-        pop_half_seconds = set()
-        for t in pop_times:
-            half_second = int(t // 0.5) * 0.5  # Convert to 0.5-second intervals
-            pop_half_seconds.add(half_second)
+    def highlight_pop_sounds(self, threshold, mode=pop_detection.DEFAULT_MODE):
+        if mode == "amplitude":
+            # Perform pop sound detection based on amplitude threshold
+            # Only the blocks whose peak exceeds the threshold are scanned
+            pop_events = self.threshold_index.detect_pops(threshold)
+        else:
+            pop_events = pop_detection.detect_pops(self.y, self.sr, threshold, mode=mode)
 
         # Update pop count label
-        self.pop_count_label.config(text=f"Detected Pops: {len(pop_half_seconds)}")
-
-        # Clear the plot and re-plot the waveform
-        self.ax.clear()
-        self.ax.plot(times, self.y, label='Audio Waveform')
-
-        # Mark the detected pop sounds (grouped by 0.5-second intervals)
-        if len(pop_half_seconds) > 0:
-            print(f"Detected pop sound(s) above {threshold} amplitude at the following times (in 0.5-second intervals):")
-            for half_sec in sorted(pop_half_seconds):
-                print(f"{half_sec:.1f} seconds")
-                self.ax.axvline(x=half_sec, color='r', linestyle='--', label=f'Pop at {half_sec:.1f}s')
-        else:
-            print(f"No pop sounds detected above {threshold} amplitude.")
+        self.pop_count_label.config(text=f"Detected Pops: {len(pop_events)}")
 
-        # Update the plot
-        self.ax.set_xlabel('Time (s)')
-        self.ax.set_ylabel('Amplitude')
-        self.ax.set_title('Audio Amplitude Over Time')
-        self.ax.legend()
-        self.canvas.draw()
+        with instrumentation.span("plot"):
+            # Clear the plot and re-plot the waveform
+            self.ax.clear()
+            plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
+
+            # Mark the detected pop sounds at their onsets (one artist, however many)
+            if len(pop_events) > 0:
+                print(f"Detected pop sound(s) above {threshold} ({mode}) at the following times:")
+                for event in pop_events:
+                    channel = f", channel {event.channel}" if self.y.ndim == 2 else ""
+                    print(f"{event.onset:.3f} seconds (duration {event.duration:.3f}s, peak {event.peak:.2f}{channel})")
+                plot_pop_markers(self.ax, [event.onset for event in pop_events], 0, len(self.y) / self.sr,
+                                 self.plot_width())
+            else:
+                print(f"No pop sounds detected above {threshold} ({mode}).")
+
+            # Update the plot
+            self.ax.set_xlabel('Time (s)')
+            self.ax.set_ylabel('Amplitude')
+            self.ax.set_title('Audio Amplitude Over Time')
+            self.ax.legend()
+            self.canvas.draw()
 
 
-# Create the main window
-root = tk.Tk()
-app = AudioPopDetector(root)
-root.mainloop()
+if __name__ == "__main__":
+    # Create the main window
+    root = tk.Tk()
+    app = AudioPopDetector(root)
+    if "--startup-time" in sys.argv:
+        # Exit as soon as the window is up; see startup.py
+        root.after_idle(root.destroy)
+    else:
+        # Import the heavy dependencies in the background once the window is shown
+        root.after_idle(startup.prewarm)
+    root.mainloop()
@@ -1,28 +1,27 @@
 import tkinter as tk
 from tkinter import filedialog
-import librosa
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
+# Figure rather than pyplot: the canvas is embedded in Tk, so no pyplot backend setup is needed
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import mutagen
-from mutagen.mp3 import MP3
-from mutagen.mp4 import MP4
-from mutagen.flac import FLAC
-from mutagen.wave import WAVE
-import datetime
-from pydub import AudioSegment
-import pygame
-import io
-import concurrent.futures
+
+import audio_metadata
+import instrumentation
+import parallel_detection
+import pop_detection
+import resampling
+import startup
+from audio_cache import AudioCache
+from threshold_index import ThresholdIndex
+from job_scheduler import JobScheduler
+from playback import AudioPlayer
+from waveform_pyramid import PeakPyramid, plot_envelope, plot_pop_markers
 
 class AudioPopDetector:
     def __init__(self, root):
         self.root = root
         self.root.title("Audio Pop Sound Detector")
 
-        # Initialize pygame mixer
-        pygame.mixer.init()
-
         # Frame for instructions
         self.instructions_frame = tk.Frame(self.root)
         self.instructions_frame.pack(pady=10)
@@ -46,13 +45,35 @@ class AudioPopDetector:
         self.detect_button = tk.Button(self.controls_frame, text="Detect Pop Sound", command=self.detect_pop_sound_parallel)
         self.detect_button.grid(row=0, column=2, padx=10)
 
+        # Cancel Button (stops any running load, detection or export)
+        self.cancel_button = tk.Button(self.controls_frame, text="Cancel", command=self.cancel_jobs)
+        self.cancel_button.grid(row=0, column=3, padx=10)
+
         # Threshold Scale
         self.threshold_label = tk.Label(self.controls_frame, text="Amplitude Threshold")
         self.threshold_label.grid(row=1, column=0, padx=10)
         self.threshold_scale = tk.Scale(self.controls_frame, from_=0, to=1, resolution=0.01, orient="horizontal", length=300)
         self.threshold_scale.set(0.4)
+        # Set after the initial value so the slider only re-runs detection when the user moves it
+        self.threshold_scale.config(command=self.on_threshold_change)
         self.threshold_scale.grid(row=1, column=1, padx=10)
 
+        # Detection mode: raw amplitude or spectral transient score
+        self.mode_label = tk.Label(self.controls_frame, text="Detection Mode")
+        self.mode_label.grid(row=2, column=0, padx=10)
+        self.mode_var = tk.StringVar(value=pop_detection.DEFAULT_MODE)
+        self.mode_menu = tk.OptionMenu(self.controls_frame, self.mode_var, *pop_detection.DETECTION_MODES,
+                                       command=self.on_mode_change)
+        self.mode_menu.grid(row=2, column=1, padx=10, sticky="w")
+
+        # How the audio is reduced to 11.025 kHz on load (speed vs. click fidelity, see resampling.py)
+        self.decimation_label = tk.Label(self.controls_frame, text="Decimation")
+        self.decimation_label.grid(row=3, column=0, padx=10)
+        self.decimation_var = tk.StringVar(value=resampling.DEFAULT_DECIMATION)
+        self.decimation_menu = tk.OptionMenu(self.controls_frame, self.decimation_var, *resampling.DECIMATION_MODES,
+                                             command=self.on_decimation_change)
+        self.decimation_menu.grid(row=3, column=1, padx=10, sticky="w")
+
         # Frame for additional info
         self.info_frame = tk.Frame(self.root)
         self.info_frame.pack(pady=10)
@@ -75,192 +96,264 @@ class AudioPopDetector:
         self.metadata_label = tk.Label(self.info_frame, text="Recording Date and Time: N/A")
         self.metadata_label.pack()
 
+        self.status_label = tk.Label(self.info_frame, text="Status: Idle")
+        self.status_label.pack()
+
         # Canvas for matplotlib graph
-        self.figure, self.ax = plt.subplots(figsize=(10, 4))
+        self.figure = Figure(figsize=(10, 4))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.figure, master=self.root)
         self.canvas.get_tk_widget().pack()
 
+        # Detected pops; selecting one (click or arrow keys) plays a short window around it
+        self.events_frame = tk.Frame(self.root)
+        self.events_frame.pack(pady=10)
+        self.events_label = tk.Label(self.events_frame, text="Select a pop to listen to it:")
+        self.events_label.pack()
+        self.events_scrollbar = tk.Scrollbar(self.events_frame, orient="vertical")
+        self.events_listbox = tk.Listbox(self.events_frame, height=6, width=50, exportselection=False,
+                                         yscrollcommand=self.events_scrollbar.set)
+        self.events_scrollbar.config(command=self.events_listbox.yview)
+        self.events_listbox.pack(side="left")
+        self.events_scrollbar.pack(side="right", fill="y")
+        self.events_listbox.bind("<<ListboxSelect>>", self.on_event_selected)
+
+        # Decoded audio is cached on disk so reloading a file skips decoding
+        self.audio_cache = AudioCache()
+
+        # Decoding, detection and export run in the background so the window stays responsive
+        self.jobs = JobScheduler(self.root)
+
         # Variables for audio data
         self.y = None
         self.sr = None
         self.file_path = None
-        self.audio_segment = None
-        self.is_playing = False
-        self.sound = None
+        self.peak_pyramid = None
+        self.threshold_index = None
+        self.pop_events = []
+
+        # Plays straight from self.y; no WAV export or second decoded copy
+        self.player = AudioPlayer()
+        self.playback_watch = None  # pending after() id of watch_playback
 
     def load_audio(self):
         # Load audio file using a file dialog
-        self.file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3 *.m4a *.flac")])
+        file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3 *.m4a *.flac")])
+        if file_path:
+            self.start_loading(file_path)
+
+    def start_loading(self, file_path):
+        # A new file makes any running detection or export meaningless
+        self.jobs.cancel()
+        self.show_status("Loading...")
+        # Header-only metadata shows up straight away, long before decoding finishes
+        self.jobs.submit("metadata", self.metadata_job, file_path, on_done=self.show_metadata,
+                         on_error=self.show_error)
+        self.jobs.submit("load", self.load_audio_job, file_path, self.decimation_var.get(),
+                         on_done=self.on_audio_loaded, on_progress=self.show_progress, on_error=self.show_error)
+
+    def on_decimation_change(self, decimation):
+        # The decimation is applied on load, so reload the current file with it
         if self.file_path:
-            # Load and downsample the audio file using librosa
-            self.y, self.sr = librosa.load(self.file_path, sr=11025, mmap=True)  # Memory map and downsample to 11.025 kHz
-            self.audio_segment = AudioSegment.from_file(self.file_path)
-
-            # Extract metadata using mutagen
-            metadata = self.get_metadata(self.file_path)
-
-            # Update info labels
-            duration = librosa.get_duration(y=self.y, sr=self.sr)
-            self.audio_duration_label.config(text=f"Duration: {duration:.2f} seconds")
-            self.sampling_rate_label.config(text=f"Sampling Rate: {self.sr} Hz")
-            self.file_name_label.config(text=f"File Name: {self.file_path.split('/')[-1]}")  # Display only the filename
-
-            if metadata and "date" in metadata:
-                self.metadata_label.config(text=f"Recording Date and Time: {metadata['date']}")
-            else:
-                self.metadata_label.config(text="Recording Date and Time: Not Available")
-
-            # Plot the waveform
-            self.plot_waveform()
-
-    def get_metadata(self, file_path):
-        """
-        Extract metadata from the audio file, including date and time if available.
-        """
-        metadata = {}
-        try:
-            if file_path.endswith(".mp3"):
-                audio = MP3(file_path)
-            elif file_path.endswith(".m4a"):
-                audio = MP4(file_path)
-            elif file_path.endswith(".flac"):
-                audio = FLAC(file_path)
-            elif file_path.endswith(".wav"):
-                audio = WAVE(file_path)
-            else:
-                audio = mutagen.File(file_path)
-
-            # Extract the date and time metadata
-            if "©day" in audio.tags:  # For .m4a files
-                metadata['date'] = audio.tags['©day'][0]
-            elif "TDRC" in audio.tags:  # For .mp3 files
-                tdrc = audio.tags.get("TDRC")
-                if tdrc:
-                    metadata['date'] = str(tdrc.text[0])
-
-            # Attempt to parse date-time
-            if 'date' in metadata:
-                try:
-                    metadata['date'] = self.parse_date_time(metadata['date'])
-                except ValueError:
-                    pass  # If parsing fails, we simply display the raw metadata
-
-        except Exception as e:
-            print(f"Error extracting metadata: {e}")
-
-        return metadata
-
-    def parse_date_time(self, date_str):
-        """
-        Parse the date and time from a string if available.
-        Supports formats like YYYY-MM-DD, YYYY-MM-DD HH:MM:SS, etc.
-        """
-        try:
-            # Try to parse date with time
-            dt = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            try:
-                # Fallback to date-only format
-                dt = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-            except ValueError:
-                # If parsing fails, return the raw string
-                return date_str
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
+            self.start_loading(self.file_path)
+
+    def metadata_job(self, job, file_path):
+        # Runs on a worker thread; reads only the file headers
+        return file_path, audio_metadata.get_metadata(file_path)
+
+    def show_metadata(self, result):
+        file_path, metadata = result
+        self.file_name_label.config(text=f"File Name: {file_path.split('/')[-1]}")  # Display only the filename
+        if "duration" in metadata:
+            self.audio_duration_label.config(text=f"Duration: {metadata['duration']:.2f} seconds")
+        if "sample_rate" in metadata:
+            channels = metadata.get("channels")
+            self.sampling_rate_label.config(
+                text=f"Sampling Rate: {metadata['sample_rate']} Hz" + (f", {channels} channel(s)" if channels else ""))
+        if "date" in metadata:
+            self.metadata_label.config(text=f"Recording Date and Time: {metadata['date']}")
+        else:
+            self.metadata_label.config(text="Recording Date and Time: Not Available")
+
+    def load_audio_job(self, job, file_path, decimation=resampling.DEFAULT_DECIMATION):
+        # Runs on a worker thread: decode and build the plot envelope and threshold index
+        job.report_progress(0.0, "Decoding")
+        # Downsample to about 11.025 kHz; channels are kept and analyzed separately
+        y, sr = pop_detection.load_audio(file_path, sr=11025, cache=self.audio_cache, mono=False,
+                                         decimation=decimation)
+        job.check_cancelled()
+        job.report_progress(0.8, "Preparing plot")
+        peak_pyramid = PeakPyramid(y)
+        threshold_index = ThresholdIndex(y, sr)
+        return file_path, y, sr, peak_pyramid, threshold_index
+
+    def on_audio_loaded(self, result):
+        # Runs on the Tk thread once loading has finished; a detection started
+        # while loading ran on the previous file's audio
+        self.jobs.cancel("detect")
+        self.file_path, self.y, self.sr, self.peak_pyramid, self.threshold_index = result
+        self.show_status("Idle")
+        self.player.set_audio(self.y, self.sr)
+        self.play_button.config(text="Play Audio")
+        self.set_pop_events([])
+
+        # Update info labels (the sampling rate label keeps the file's own rate from the header)
+        duration = len(self.y) / self.sr
+        self.audio_duration_label.config(text=f"Duration: {duration:.2f} seconds")
+        self.file_name_label.config(text=f"File Name: {self.file_path.split('/')[-1]}")  # Display only the filename
+
+        # Plot the waveform
+        self.plot_waveform()
 
     def plot_waveform(self):
-        # Plot the audio waveform with downsampled data
+        # Plot the audio waveform at the resolution of the screen
         if self.y is not None:
-            self.ax.clear()
-            
-            # Plot every 100th sample for efficiency
-            downsample_factor = 100
-            times = np.arange(len(self.y))[::downsample_factor] / self.sr
-            y_downsampled = self.y[::downsample_factor]
-            
-            self.ax.plot(times, y_downsampled, label='Audio Waveform (Downsampled)')
-            self.ax.set_xlabel('Time (s)')
-            self.ax.set_ylabel('Amplitude')
-            self.ax.set_title('Audio Amplitude Over Time')
-            self.ax.legend()
-            self.canvas.draw()
-
-    def detect_pop_in_chunk(self, chunk, start_idx):
-        # Detect pops in a single chunk of audio
-        times = np.arange(start_idx, start_idx + len(chunk)) / self.sr
-        threshold = self.threshold_scale.get()
-        pop_indices = np.where(np.abs(chunk) > threshold)[0]
-        return times[pop_indices]
+            with instrumentation.span("plot"):
+                self.ax.clear()
+
+                # The min/max envelope keeps every peak, unlike plotting every 100th sample
+                plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
+                self.ax.set_xlabel('Time (s)')
+                self.ax.set_ylabel('Amplitude')
+                self.ax.set_title('Audio Amplitude Over Time')
+                self.ax.legend()
+                self.canvas.draw()
+
+    def plot_width(self):
+        # Width of the plot in pixels, used to pick the waveform envelope resolution
+        width = self.canvas.get_tk_widget().winfo_width()
+        return width if width > 1 else 1000
+
+    def on_mode_change(self, mode):
+        # The slider gates the transient score (0-1) instead of the amplitude in spectral mode
+        self.threshold_label.config(text="Transient Threshold" if mode == "spectral" else "Amplitude Threshold")
+        self.detect_pop_sound_parallel()
+
+    def on_threshold_change(self, value):
+        # Show the pop count from the threshold index immediately, then
+        # re-detect; each new value supersedes the running job
+        if self.y is not None:
+            if self.mode_var.get() == "amplitude":
+                count = self.threshold_index.count(float(value))
+                self.pop_count_label.config(text=f"Detected Pops: {count}")
+            self.detect_pop_sound_parallel()
 
     def detect_pop_sound_parallel(self):
-        chunk_duration = 600  # 10-minute chunks
-        chunk_size = int(self.sr * chunk_duration)
-        total_chunks = len(self.y) // chunk_size
-
-        pop_times = []
-
-        # Use ThreadPoolExecutor for parallel processing
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = []
-            for i in range(total_chunks + 1):
-                start_idx = i * chunk_size
-                end_idx = min((i + 1) * chunk_size, len(self.y))
-                chunk = self.y[start_idx:end_idx]
-                futures.append(executor.submit(self.detect_pop_in_chunk, chunk, start_idx))
-
-            for future in concurrent.futures.as_completed(futures):
-                pop_times.extend(future.result())
-
-        # Group pop times by 0.5-second intervals and update the UI
-        pop_half_seconds = set(int(t // 0.5) * 0.5 for t in pop_times)
-        self.pop_count_label.config(text=f"Detected Pops: {len(pop_half_seconds)}")
+        if self.y is None:
+            return
 
-        # Optionally, mark the pop sounds on the plot (can be done here if needed)
-        self.highlight_pop_sounds(pop_half_seconds)
+        # Read the threshold once on the Tk thread; workers only see the plain value
+        threshold = self.threshold_scale.get()
+        mode = self.mode_var.get()
+        self.show_status(f"Detecting pops above {threshold} ({mode})...")
+        self.jobs.submit("detect", self.detect_pop_job, self.y, self.sr, threshold, mode,
+                         on_done=self.on_pops_detected, on_progress=self.show_progress, on_error=self.show_error)
+
+    def detect_pop_job(self, job, y, sr, threshold, mode=pop_detection.DEFAULT_MODE):
+        # Runs on a worker thread; never touches Tk. The chunks are sized from
+        # the core count and cache size and scanned on a shared thread pool.
+        def on_progress(fraction):
+            job.check_cancelled()
+            job.report_progress(fraction, "Detecting")
+
+        # The events are tagged with the audio they were detected in
+        return y, parallel_detection.detect_pops_parallel(y, sr, threshold, pop_detection.DEFAULT_MERGE_GAP, mode,
+                                                          on_progress=on_progress)
+
+    def on_pops_detected(self, result):
+        # Runs on the Tk thread with the result of the latest detection job
+        y, pop_events = result
+        if y is not self.y:
+            return  # detected in audio that has since been replaced
+        self.show_status("Idle")
+        self.pop_count_label.config(text=f"Detected Pops: {len(pop_events)}")
+        self.set_pop_events(pop_events)
+
+        # Mark the pop onsets on the plot
+        self.highlight_pop_sounds([event.onset for event in pop_events])
 
     def highlight_pop_sounds(self, pop_times):
         # Clear the plot and re-plot with highlights
         if self.y is not None:
-            self.ax.clear()
-
-            # Plot every 100th sample for efficiency
-            downsample_factor = 100
-            times = np.arange(len(self.y))[::downsample_factor] / self.sr
-            y_downsampled = self.y[::downsample_factor]
-
-            self.ax.plot(times, y_downsampled, label='Audio Waveform (Downsampled)')
+            with instrumentation.span("plot"):
+                self.ax.clear()
+                plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
             
-            # Mark pop sound times with red dots
-            for pop_time in pop_times:
-                self.ax.axvline(x=pop_time, color='r', linestyle='--', label='Pop Detected')
-
-            self.ax.set_xlabel('Time (s)')
-            self.ax.set_ylabel('Amplitude')
-            self.ax.set_title('Audio Amplitude Over Time with Pop Sounds Highlighted')
-            self.ax.legend()
-            self.canvas.draw()
+                # Mark pop sound times with one collection (density shading when they crowd)
+                plot_pop_markers(self.ax, pop_times, 0, len(self.y) / self.sr, self.plot_width())
+
+                self.ax.set_xlabel('Time (s)')
+                self.ax.set_ylabel('Amplitude')
+                self.ax.set_title('Audio Amplitude Over Time with Pop Sounds Highlighted')
+                self.ax.legend()
+                self.canvas.draw()
+
+    def set_pop_events(self, pop_events):
+        self.pop_events = pop_events
+        self.events_listbox.delete(0, tk.END)
+        multichannel = self.y is not None and self.y.ndim == 2
+        self.events_listbox.insert(tk.END, *[
+            f"{event.onset:9.3f} s   peak {event.peak:.2f}   duration {event.duration:.3f} s"
+            + (f"   channel {event.channel}" if multichannel else "") for event in pop_events])
+
+    def on_event_selected(self, event):
+        # Audition the selected pop; moving the selection restarts playback at the next one
+        selection = self.events_listbox.curselection()
+        if selection and self.y is not None:
+            self.player.play_window(self.pop_events[selection[0]].onset)
+            self.watch_playback()
 
     def toggle_playback(self):
-        # Toggle audio playback using pygame mixer
-        if self.audio_segment is None:
+        # Toggle playback of the whole file from the decoded samples
+        if self.y is None:
             return
 
-        if self.is_playing:
-            pygame.mixer.music.stop()
-            self.is_playing = False
+        if self.player.is_playing:
+            self.player.stop()
             self.play_button.config(text="Play Audio")
         else:
-            if not pygame.mixer.music.get_busy():
-                audio_data = io.BytesIO(self.audio_segment.export(format="wav").read())
-                pygame.mixer.music.load(audio_data)
-                pygame.mixer.music.play()
-            self.is_playing = True
+            self.player.play()
+            self.watch_playback()
+
+    def watch_playback(self):
+        # Keep the button in sync with the player; it stops by itself at the end.
+        # Only one check is ever pending, however often playback is restarted.
+        if self.playback_watch is not None:
+            self.root.after_cancel(self.playback_watch)
+            self.playback_watch = None
+        if self.player.is_playing:
             self.play_button.config(text="Stop Audio")
+            self.playback_watch = self.root.after(100, self.watch_playback)
+        else:
+            self.play_button.config(text="Play Audio")
+
+    def cancel_jobs(self):
+        self.jobs.cancel()
+        self.show_status("Cancelled")
+
+    def show_status(self, text):
+        self.status_label.config(text=f"Status: {text}")
+
+    def show_progress(self, fraction, message):
+        self.show_status(f"{message} ({fraction:.0%})")
+
+    def show_error(self, error):
+        print(f"Error: {error}")
+        self.show_status(f"Error: {error}")
+
+if __name__ == "__main__":
+    # Create the main window
+    root = tk.Tk()
 
-# Create the main window
-root = tk.Tk()
+    # Initialize the application
+    app = AudioPopDetector(root)
 
-# Initialize the application
-app = AudioPopDetector(root)
+    if "--startup-time" in sys.argv:
+        # Exit as soon as the window is up; see startup.py
+        root.after_idle(root.destroy)
+    else:
+        # Import the heavy dependencies in the background once the window is shown
+        root.after_idle(startup.prewarm)
 
-# Run the application
-root.mainloop()
+    # Run the application
+    root.mainloop()
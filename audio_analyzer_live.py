@@ -1,13 +1,25 @@
 import tkinter as tk
 from tkinter import filedialog
-import librosa
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
+# Figure rather than pyplot: the canvas is embedded in Tk, so no pyplot backend setup is needed
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import sounddevice as sd
-import threading
 import datetime
 
+import instrumentation
+import pop_detection
+import startup
+from audio_cache import AudioCache
+from capture_buffer import CaptureBuffer
+from live_detection import LiveDetectionWorker
+from live_plot import ScrollingWaveformPlot
+from waveform_pyramid import PeakPyramid, plot_envelope, plot_pop_markers
+
+LIVE_POLL_INTERVAL = 25  # milliseconds between checks for live pop events
+INPUT_BLOCK_DURATION = 0.01  # seconds per input block; live detection latency depends on it
+MAX_INPUT_CHANNELS = 2  # record at most this many of the input device's channels
+
 
 class AudioPopDetector:
     def __init__(self, root):
@@ -40,10 +52,19 @@ class AudioPopDetector:
         # Threshold Scale
         self.threshold_label = tk.Label(self.controls_frame, text="Amplitude Threshold")
         self.threshold_label.grid(row=1, column=0, padx=10)
-        self.threshold_scale = tk.Scale(self.controls_frame, from_=0, to=1, resolution=0.01, orient="horizontal", length=300)
+        self.threshold_scale = tk.Scale(self.controls_frame, from_=0, to=1, resolution=0.01, orient="horizontal", length=300,
+                                        command=self.on_threshold_change)
         self.threshold_scale.set(0.4)
         self.threshold_scale.grid(row=1, column=1, padx=10)
 
+        # Detection mode: raw amplitude or spectral transient score
+        self.mode_label = tk.Label(self.controls_frame, text="Detection Mode")
+        self.mode_label.grid(row=2, column=0, padx=10)
+        self.mode_var = tk.StringVar(value=pop_detection.DEFAULT_MODE)
+        self.mode_menu = tk.OptionMenu(self.controls_frame, self.mode_var, *pop_detection.DETECTION_MODES,
+                                       command=self.on_mode_change)
+        self.mode_menu.grid(row=2, column=1, padx=10, sticky="w")
+
         # Frame for additional info
         self.info_frame = tk.Frame(self.root)
         self.info_frame.pack(pady=10)
@@ -67,26 +88,37 @@ class AudioPopDetector:
         self.metadata_label.pack()
 
         # Canvas for matplotlib graph
-        self.figure, self.ax = plt.subplots(figsize=(10, 4))
+        self.figure = Figure(figsize=(10, 4))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.figure, master=self.root)
         self.canvas.get_tk_widget().pack()
 
+        # Decoded audio is cached on disk so reloading a file skips decoding
+        self.audio_cache = AudioCache()
+
         # Variables for audio data
         self.y = np.array([])
         self.sr = 44100  # Default sample rate for recording
+        self.peak_pyramid = None
+        self.capture = None
+        self.live_worker = None
+        self.live_pop_events = []
+        self.live_pop_onsets = []
+        self.live_plot = None
         self.recording = False
         self.stream = None
-        self.plot_thread = None
 
     def load_audio(self):
         # Load audio file using a file dialog
         self.file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3 *.m4a *.flac")])
         if self.file_path:
-            # Load the audio file using librosa for waveform analysis
-            self.y, self.sr = librosa.load(self.file_path, sr=None)
+            # Load the audio file using the detection engine for waveform analysis
+            # (every channel is kept and analyzed separately)
+            self.y, self.sr = pop_detection.load_audio(self.file_path, sr=None, cache=self.audio_cache, mono=False)
+            self.peak_pyramid = PeakPyramid(self.y)
 
             # Update info labels
-            duration = librosa.get_duration(y=self.y, sr=self.sr)
+            duration = len(self.y) / self.sr
             self.audio_duration_label.config(text=f"Duration: {duration:.2f} seconds")
             self.sampling_rate_label.config(text=f"Sampling Rate: {self.sr} Hz")
             self.file_name_label.config(text=f"File Name: {self.file_path.split('/')[-1]}")
@@ -106,14 +138,34 @@ class AudioPopDetector:
         self.record_button.config(text="Stop Recording")
         self.y = np.array([])  # Reset the audio data
 
-        # Start a separate thread to handle the recording
-        self.stream = sd.InputStream(callback=self.audio_callback, channels=1, samplerate=self.sr)
+        # Record the input device's channels up to MAX_INPUT_CHANNELS; PulseAudio and
+        # PipeWire report 32 or more for their default device
+        import sounddevice as sd
+
+        channels = max(1, min(MAX_INPUT_CHANNELS, sd.query_devices(kind='input')['max_input_channels']))
+
+        # Captured blocks go into an append-only buffer instead of np.append
+        if self.capture is not None:
+            self.capture.close()
+        self.capture = CaptureBuffer(self.sr, channels=channels)
+
+        # Detect pops on each captured block in the background
+        self.live_pop_events = []
+        self.live_pop_onsets = []
+        self.pop_count_label.config(text="Detected Pops: 0")
+        self.live_worker = LiveDetectionWorker(self.capture, self.threshold_scale.get())
+        self.live_worker.start()
+        self.root.after(LIVE_POLL_INTERVAL, self.poll_live_events)
+
+        # Start a separate thread to handle the recording. Ask for short blocks:
+        # left to itself PortAudio often delivers 1024-4096 frames at a time
+        self.stream = sd.InputStream(callback=self.audio_callback, channels=channels, samplerate=self.sr,
+                                     blocksize=int(self.sr * INPUT_BLOCK_DURATION), latency="low")
         self.stream.start()
 
-        # Start a thread to update the plot periodically
-        if self.plot_thread is None or not self.plot_thread.is_alive():
-            self.plot_thread = threading.Thread(target=self.update_plot, daemon=True)
-            self.plot_thread.start()
+        # Show a scrolling view of the latest audio, refreshed from the Tk thread
+        self.live_plot = ScrollingWaveformPlot(self.ax, self.canvas, self.sr)
+        self.root.after(0, self.refresh_live_plot)
 
     def stop_recording(self):
         # Stop recording and stop the stream
@@ -121,83 +173,141 @@ class AudioPopDetector:
         if self.stream is not None:
             self.stream.stop()
             self.stream.close()
-        
+
+        # Let the detector finish the captured audio and collect its last events
+        if self.live_worker is not None:
+            self.live_worker.stop()
+            self.poll_live_events()
+
+        if self.live_plot is not None:
+            self.live_plot.close()
+            self.live_plot = None
+
+        # Move the finished recording out of the capture buffer for analysis,
+        # chunk by chunk so a long session does not need twice its size in memory
+        if self.capture is not None:
+            self.y = self.capture.take(channel=None if self.capture.channels > 1 else 0)
+            self.peak_pyramid = PeakPyramid(self.y)
+            self.plot_waveform()
+
         self.record_button.config(text="Start Recording")
         self.metadata_label.config(text=f"Recording Date and Time: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     def audio_callback(self, indata, frames, time, status):
         # This is called for every audio block captured by sounddevice
         if self.recording:
-            self.y = np.append(self.y, indata.flatten())  # Append the new audio data
+            self.capture.write(indata)  # O(block) append, no reallocation
+            self.live_worker.notify()
+
+    def on_mode_change(self, mode):
+        # The slider gates the transient score (0-1) instead of the amplitude in spectral mode
+        self.threshold_label.config(text="Transient Threshold" if mode == "spectral" else "Amplitude Threshold")
+
+    def on_threshold_change(self, value):
+        # Live detection picks up the new threshold from the next block on.
+        # The live markers are always amplitude based, so a transient
+        # threshold is only used by Detect Pop Sound.
+        if self.live_worker is not None and self.mode_var.get() == "amplitude":
+            self.live_worker.threshold = float(value)
+
+    def poll_live_events(self):
+        # Runs on the Tk thread: collect pops found by the live detection worker
+        events = self.live_worker.drain() if self.live_worker is not None else []
+        for event in events:
+            channel = f", channel {event.channel}" if self.capture.channels > 1 else ""
+            print(f"Live pop at {event.onset:.3f} seconds "
+                  f"(duration {event.duration:.3f}s, peak {event.peak:.2f}{channel})")
+        if events:
+            self.live_pop_events.extend(events)
+            self.live_pop_onsets.extend(event.onset for event in events)
+            self.pop_count_label.config(text=f"Detected Pops: {len(self.live_pop_events)}")
+        if self.recording:
+            self.root.after(LIVE_POLL_INTERVAL, self.poll_live_events)
 
-    def update_plot(self):
-        # Update the plot every 1 second if recording is ongoing
-        while self.recording:
-            self.root.after(0, self.plot_waveform)
-            sd.sleep(1000)  # Sleep for 1 second
+    def refresh_live_plot(self):
+        # Redraw the scrolling view; the plot decides how soon the next frame is due
+        if self.recording and self.live_plot is not None:
+            delay = self.live_plot.update(self.capture, self.live_pop_onsets)
+            self.root.after(int(delay * 1000), self.refresh_live_plot)
 
-    def plot_waveform(self):
-        # Plot the audio waveform
-        if len(self.y) > 0:
-            self.ax.clear()
-
-            # Generate the time axis based on the current length of self.y
-            times = np.arange(len(self.y)) / self.sr
+    def has_audio(self):
+        if self.recording:
+            return len(self.capture) > 0
+        return len(self.y) > 0
 
-            # Ensure the lengths of times and y match before plotting
-            if len(times) == len(self.y):
-                self.ax.plot(times, self.y, label='Live Audio Waveform')
+    def plot_waveform(self):
+        # Plot the audio waveform at the resolution of the screen (the live view handles recording)
+        if not self.recording and len(self.y) > 0:
+            with instrumentation.span("plot"):
+                self.ax.clear()
+                plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
                 self.ax.set_xlabel('Time (s)')
                 self.ax.set_ylabel('Amplitude')
                 self.ax.set_title('Audio Amplitude Over Time')
                 self.ax.legend()
                 self.canvas.draw()
 
+    def plot_width(self):
+        # Width of the plot in pixels, used to pick the waveform envelope resolution
+        width = self.canvas.get_tk_widget().winfo_width()
+        return width if width > 1 else 1000
+
     def detect_pop_sound(self):
-        if len(self.y) > 0:
+        if self.has_audio():
             # Get the amplitude threshold value from the scale
             threshold = self.threshold_scale.get()
 
-            # Detect and highlight pop sounds based on amplitude
-            self.highlight_pop_sounds(threshold)
+            # Detect and highlight pop sounds with the selected detector
+            self.highlight_pop_sounds(threshold, self.mode_var.get())
 
-    def highlight_pop_sounds(self, threshold):
-        # Perform pop sound detection based on amplitude threshold
-        times = np.arange(len(self.y)) / self.sr
-        pop_indices = np.where(np.abs(self.y) > threshold)[0]
-        pop_times = times[pop_indices]
+    def highlight_pop_sounds(self, threshold, mode=pop_detection.DEFAULT_MODE):
+        # Perform pop sound detection based on amplitude or transient threshold
+        if self.recording:
+            # Scan the capture buffer chunk by chunk without copying it; the
+            # live view already marks pops, so only report them
+            pop_events = pop_detection.detect_pops_in_stream(self.capture.blocks(channel=None), self.sr, threshold,
+                                                             mode=mode)
+            self.pop_count_label.config(text=f"Detected Pops: {len(pop_events)}")
+            print(f"Detected {len(pop_events)} pop sound(s) above {threshold} ({mode}) so far.")
+            return
 
-        # Group pop times by 0.5-second intervals
-        pop_half_seconds = set()
-        for t in pop_times:
-            half_second = int(t // 0.5) * 0.5  # Convert to 0.5-second intervals
-            pop_half_seconds.add(half_second)
+        pop_events = pop_detection.detect_pops(self.y, self.sr, threshold, mode=mode)
 
         # Update pop count label
-        self.pop_count_label.config(text=f"Detected Pops: {len(pop_half_seconds)}")
-
-        # Clear the plot and re-plot the waveform
-        self.ax.clear()
-        self.ax.plot(times, self.y, label='Audio Waveform')
-
-        # Mark the detected pop sounds (grouped by 0.5-second intervals)
-        if len(pop_half_seconds) > 0:
-            print(f"Detected pop sound(s) above {threshold} amplitude at the following times (in 0.5-second intervals):")
-            for half_sec in sorted(pop_half_seconds):
-                print(f"{half_sec:.1f} seconds")
-                self.ax.axvline(x=half_sec, color='r', linestyle='--', label=f'Pop at {half_sec:.1f}s')
-        else:
-            print(f"No pop sounds detected above {threshold} amplitude.")
-
-        # Update the plot
-        self.ax.set_xlabel('Time (s)')
-        self.ax.set_ylabel('Amplitude')
-        self.ax.set_title('Audio Amplitude Over Time')
-        self.ax.legend()
-        self.canvas.draw()
+        self.pop_count_label.config(text=f"Detected Pops: {len(pop_events)}")
 
-
-# Create the main window
-root = tk.Tk()
-app = AudioPopDetector(root)
-root.mainloop()
+        with instrumentation.span("plot"):
+            # Clear the plot and re-plot the waveform
+            self.ax.clear()
+            plot_envelope(self.ax, self.peak_pyramid, self.sr, self.plot_width(), label='Audio Waveform')
+
+            # Mark the detected pop sounds at their onsets (one artist, however many)
+            if len(pop_events) > 0:
+                print(f"Detected pop sound(s) above {threshold} ({mode}) at the following times:")
+                for event in pop_events:
+                    channel = f", channel {event.channel}" if self.y.ndim == 2 else ""
+                    print(f"{event.onset:.3f} seconds (duration {event.duration:.3f}s, peak {event.peak:.2f}{channel})")
+                plot_pop_markers(self.ax, [event.onset for event in pop_events], 0, len(self.y) / self.sr,
+                                 self.plot_width())
+            else:
+                print(f"No pop sounds detected above {threshold} ({mode}).")
+
+            # Update the plot
+            self.ax.set_xlabel('Time (s)')
+            self.ax.set_ylabel('Amplitude')
+            self.ax.set_title('Audio Amplitude Over Time')
+            self.ax.legend()
+            self.canvas.draw()
+
+
+if __name__ == "__main__":
+    # Create the main window
+    root = tk.Tk()
+    app = AudioPopDetector(root)
+    if "--startup-time" in sys.argv:
+        # Exit as soon as the window is up; see startup.py
+        root.after_idle(root.destroy)
+    else:
+        # Import the heavy dependencies in the background once the window is shown
+        root.after_idle(startup.prewarm)
+    root.mainloop()
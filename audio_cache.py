@@ -0,0 +1,134 @@
+"""
+Persistent, content-addressed cache of decoded audio.
+
+Decoded float32 PCM is stored as .npy files keyed by the SHA-256 of the source
+file, the target sample rate (and decimation mode) and the decoder version, so
+re-analyzing the same recording (e.g. with a different threshold) skips
+decoding entirely. Cached arrays are returned memory-mapped and read-only. The
+cache is bounded in size and evicts the least recently used entries first.
+"""
+import hashlib
+import importlib.metadata
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from resampling import DEFAULT_DECIMATION
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "audio_analyzer")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+CACHE_FORMAT_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    """
+    Return the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decoder_version():
+    """
+    Identify the decoder so entries are invalidated when it changes.
+    Reads the installed version without importing librosa, so cache hits
+    never pay librosa's import cost.
+    """
+    return f"v{CACHE_FORMAT_VERSION}-librosa{importlib.metadata.version('librosa')}"
+
+
+class AudioCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, file_path, sr=None, mono=True, decimation=DEFAULT_DECIMATION):
+        sr_tag = "native" if sr is None else str(int(sr))
+        if sr is not None and decimation != DEFAULT_DECIMATION:
+            sr_tag += f"-{decimation}"
+        channel_tag = "" if mono else "-multi"
+        return f"{file_hash(file_path)}-{sr_tag}{channel_tag}-{decoder_version()}"
+
+    def load(self, file_path, sr=None, mono=True, decimation=DEFAULT_DECIMATION):
+        """
+        Return (y, sr) for a file, decoding it only on a cache miss.
+        y is a read-only memory map of the cached .npy file, (frames,
+        channels) if mono is False.
+        """
+        key = self.key(file_path, sr, mono, decimation)
+        data_path = os.path.join(self.cache_dir, key + ".npy")
+        meta_path = os.path.join(self.cache_dir, key + ".json")
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            y = np.load(data_path, mmap_mode="r")
+            # Mark the entry as recently used for LRU eviction
+            os.utime(data_path)
+            return y, meta["sr"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        import pop_detection
+
+        # (frames, channels) if not mono
+        y, loaded_sr = pop_detection.decode_audio(file_path, sr=sr, mono=mono, decimation=decimation)
+        self._store(data_path, meta_path, np.ascontiguousarray(y, dtype=np.float32),
+                    {"sr": loaded_sr, "source": os.path.abspath(file_path)})
+        # Map the new entry before evicting so it stays readable even if it is
+        # larger than the whole cache budget
+        y = np.load(data_path, mmap_mode="r")
+        self.evict()
+        return y, loaded_sr
+
+    def _store(self, data_path, meta_path, y, meta):
+        # Write to temporary files and rename so concurrent readers (e.g. batch
+        # workers) never see a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, y)
+        os.replace(tmp_path, data_path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def entries(self):
+        """
+        Return [(path, size, last_used)] for every cached .npy file.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            for stale_path in (path, path[:-len(".npy")] + ".json"):
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith((".npy", ".json")):
+                os.remove(entry.path)
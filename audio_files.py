@@ -0,0 +1,31 @@
+"""
+Finding audio files among command-line inputs, shared by the batch tools.
+Kept free of heavy imports so modules the GUIs load at startup can use it.
+"""
+import glob
+import os
+import sys
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+
+
+def find_audio_files(inputs):
+    """
+    Expand directories (recursively), glob patterns and plain file paths into
+    a sorted, de-duplicated list of audio files.
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for dir_path, _, file_names in os.walk(item):
+                for file_name in file_names:
+                    if file_name.lower().endswith(AUDIO_EXTENSIONS):
+                        files.add(os.path.join(dir_path, file_name))
+        elif glob.has_magic(item):
+            files.update(path for path in glob.glob(item, recursive=True)
+                         if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            print(f"Skipping missing input: {item}", file=sys.stderr)
+    return sorted(files)
@@ -0,0 +1,224 @@
+"""
+Header-only metadata scanning.
+
+read_metadata() gets duration, sample rate, channels, codec and the
+recording date/time from a file's headers and tags with mutagen (falling
+back to libsndfile's header parser), without decoding any audio. That is
+fast enough to inventory large archives.
+
+MetadataIndex keeps the results in SQLite keyed by absolute path, together
+with each file's size and modification time, so later scans only re-read
+files that were added or changed. The index is a plain SQLite table and can be
+queried directly or with --where:
+
+    python audio_metadata.py archive/ --index archive.sqlite --workers 8
+    python audio_metadata.py archive/ --index archive.sqlite --where "duration > 3600"
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import sys
+import time
+
+from audio_files import find_audio_files
+
+DEFAULT_INDEX_PATH = "audio_metadata.sqlite"
+FIELDS = ["duration", "sample_rate", "channels", "codec", "date"]
+# Below this many files a process pool costs more than it saves
+MIN_PARALLEL_FILES = 64
+
+
+def parse_date_time(date_str):
+    """
+    Parse the date and time from a string if available.
+    Supports formats like YYYY-MM-DD, YYYY-MM-DD HH:MM:SS, etc.
+    """
+    try:
+        # Try to parse date with time
+        dt = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        try:
+            # Fallback to date-only format
+            dt = datetime.datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            # If parsing fails, return the raw string
+            return date_str
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _open_mutagen(file_path):
+    import mutagen
+    from mutagen.mp3 import MP3
+    from mutagen.mp4 import MP4
+    from mutagen.flac import FLAC
+    from mutagen.wave import WAVE
+
+    if file_path.endswith(".mp3"):
+        return MP3(file_path)
+    elif file_path.endswith(".m4a"):
+        return MP4(file_path)
+    elif file_path.endswith(".flac"):
+        return FLAC(file_path)
+    elif file_path.endswith(".wav"):
+        return WAVE(file_path)
+    return mutagen.File(file_path)
+
+
+def read_metadata(file_path):
+    """
+    Read metadata from the file headers only. Returns a dict with duration
+    (seconds), sample_rate, channels, codec and date (None where unknown).
+    Raises if the file cannot be parsed at all.
+    """
+    metadata = dict.fromkeys(FIELDS)
+    try:
+        audio = _open_mutagen(file_path)
+    except Exception:
+        audio = None
+
+    if audio is not None:
+        info = audio.info
+        metadata["duration"] = getattr(info, "length", None)
+        metadata["sample_rate"] = getattr(info, "sample_rate", None)
+        metadata["channels"] = getattr(info, "channels", None)
+        metadata["codec"] = getattr(info, "codec", None) or type(audio).__name__.lower()
+
+        # Extract the date and time metadata
+        tags = audio.tags or {}
+        if "©day" in tags:  # For .m4a files
+            metadata["date"] = tags["©day"][0]
+        elif "TDRC" in tags:  # For .mp3 files
+            tdrc = tags.get("TDRC")
+            if tdrc:
+                metadata["date"] = str(tdrc.text[0])
+    else:
+        # Formats mutagen does not know (e.g. AIFF-C, some WAV variants)
+        import soundfile as sf
+
+        info = sf.info(file_path)
+        metadata.update(duration=info.duration, sample_rate=info.samplerate, channels=info.channels,
+                        codec=info.subtype.lower())
+
+    # Attempt to parse date-time; if parsing fails the raw string is kept
+    if metadata["date"] is not None:
+        metadata["date"] = parse_date_time(metadata["date"])
+    return metadata
+
+
+def get_metadata(file_path):
+    """
+    Like read_metadata, but errors are printed and give an empty dict, and
+    only known fields are included (the front-ends check for "date").
+    """
+    try:
+        metadata = read_metadata(file_path)
+    except Exception as e:
+        print(f"Error extracting metadata: {e}")
+        return {}
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+def _scan_file(file_path):
+    # Worker entry point: errors are recorded in the index, not raised
+    try:
+        return file_path, read_metadata(file_path), None
+    except Exception as e:
+        return file_path, dict.fromkeys(FIELDS), str(e)
+
+
+class MetadataIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        import sqlite3  # only the index needs it, not the GUIs reading single files
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "duration REAL, sample_rate INTEGER, channels INTEGER, codec TEXT, date TEXT, "
+            "error TEXT, scanned_at REAL)")
+        self.connection.commit()
+
+    def scan(self, files, workers=None, prune=False):
+        """
+        Bring the index up to date for files, re-reading only files whose
+        size or modification time changed. With prune, rows for indexed
+        files that are no longer in files are deleted.
+        Returns a dict with the number of scanned, unchanged and removed files.
+        """
+        known = {row["path"]: (row["size"], row["mtime_ns"])
+                 for row in self.connection.execute("SELECT path, size, mtime_ns FROM files")}
+        stats = {}
+        for file_path in map(os.path.abspath, files):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            stats[file_path] = (st.st_size, st.st_mtime_ns)
+        changed = [file_path for file_path, stat in stats.items() if known.get(file_path) != stat]
+
+        if len(changed) < MIN_PARALLEL_FILES or workers == 1:
+            results = map(_scan_file, changed)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_scan_file, changed, chunksize=64)
+        try:
+            now = time.time()
+            rows = [(file_path, *stats[file_path], *(metadata[field] for field in FIELDS), error, now)
+                    for file_path, metadata, error in results]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        removed = [path for path in known if path not in stats] if prune else []
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+        return {"scanned": len(rows), "unchanged": len(stats) - len(rows), "removed": len(removed)}
+
+    def get(self, file_path):
+        row = self.connection.execute("SELECT * FROM files WHERE path = ?", (os.path.abspath(file_path),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def query(self, where=None, params=()):
+        """
+        Return indexed rows as dicts, optionally filtered by an SQL WHERE
+        clause, e.g. query("duration > ? AND codec = ?", (3600, "mp3")).
+        """
+        sql = "SELECT * FROM files" + (f" WHERE {where}" if where else "") + " ORDER BY path"
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index audio metadata from file headers without decoding.")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--prune", action="store_true", help="Drop index rows for files that no longer exist")
+    parser.add_argument("--where", help="Print indexed rows matching this SQL condition as JSONL")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    files = find_audio_files(args.inputs)
+    index = MetadataIndex(args.index)
+    try:
+        counts = index.scan(files, args.workers, args.prune)
+        elapsed = time.perf_counter() - start_time
+        print(f"Indexed {len(files)} file(s) in {elapsed:.2f}s: {counts['scanned']} scanned, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed", file=sys.stderr)
+        if args.where:
+            for row in index.query(args.where):
+                print(json.dumps(row))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
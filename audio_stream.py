@@ -0,0 +1,148 @@
+"""
+Streaming, block-wise audio decoding.
+
+AudioStream decodes (and optionally resamples) a file in fixed-size blocks so
+that peak memory stays constant however long the recording is. Formats that
+libsndfile understands (WAV, FLAC, OGG, ...) are read block by block straight
+from disk; anything else (e.g. M4A) falls back to audioread's incremental
+decoder.
+
+Decoding can start at a native frame offset (libsndfile formats only), e.g.
+to analyze just the part of a recording that was appended since last time.
+
+The rate is reduced block by block with any of resampling.STREAMING_MODES.
+"""
+import collections
+
+import numpy as np
+
+from resampling import DEFAULT_DECIMATION, STREAMING_MODES, StreamDecimator, output_rate
+
+DEFAULT_BLOCK_DURATION = 30.0  # seconds of audio per block
+DEFAULT_OVERLAP_DURATION = 0.0  # seconds repeated from the previous block
+
+# One block of float32 samples, mono (frames,) or (frames, channels). start
+# is the sample index of data[0] in the whole (resampled) signal and overlap
+# is the number of leading samples that were already part of the previous
+# block.
+AudioBlock = collections.namedtuple("AudioBlock", ["start", "data", "overlap"])
+
+
+class AudioStream:
+    def __init__(self, file_path, sr=None, block_duration=DEFAULT_BLOCK_DURATION,
+                 overlap_duration=DEFAULT_OVERLAP_DURATION, start=0, mono=True, decimation=DEFAULT_DECIMATION):
+        self.file_path = file_path
+        self.decimation = decimation
+        self.mono = mono  # downmix, or keep (frames, channels) blocks
+        self.start = start  # first native frame to decode
+        self.frames_read = start  # native frame position reached so far
+
+        # Probe the source without decoding it; soundfile is imported here so that
+        # importing AudioBlock (e.g. from capture_buffer) stays light
+        import soundfile as sf
+
+        try:
+            info = sf.info(file_path)
+            self.native_sr = info.samplerate
+            self.channels = info.channels
+            self.use_soundfile = True
+        except (sf.LibsndfileError, RuntimeError):
+            import audioread
+
+            with audioread.audio_open(file_path) as source:
+                self.native_sr = source.samplerate
+                self.channels = source.channels
+            self.use_soundfile = False
+        if start and not self.use_soundfile:
+            raise ValueError(f"Cannot start decoding mid-file for {file_path}: format is not seekable")
+
+        if decimation not in STREAMING_MODES:
+            raise ValueError(f"Decimation mode {decimation!r} cannot be applied while streaming")
+        self.target_sr = sr
+        self.sr = output_rate(self.native_sr, sr, decimation)  # may differ from sr, see resampling.py
+        self.block_size = max(1, int(block_duration * self.sr))
+        self.overlap = int(overlap_duration * self.sr)
+
+    def __iter__(self):
+        return self._reblock(self._resample(self._read_native()))
+
+    @property
+    def frame_shape(self):
+        # Shape of one frame of output: () for mono, (channels,) otherwise
+        return () if self.mono else (self.channels,)
+
+    def _downmix(self, piece):
+        # piece is (frames, channels)
+        if not self.mono:
+            return piece
+        return piece.mean(axis=1, dtype=np.float32) if self.channels > 1 else piece[:, 0]
+
+    def _read_native(self):
+        # Yield float32 pieces of arbitrary size at the native sample rate
+        native_block_size = max(1, int(self.block_size * self.native_sr / self.sr))
+        if self.use_soundfile:
+            import soundfile as sf
+
+            for piece in sf.blocks(self.file_path, blocksize=native_block_size, dtype="float32", always_2d=True,
+                                   start=self.start):
+                self.frames_read += len(piece)
+                yield self._downmix(piece)
+        else:
+            import audioread
+
+            with audioread.audio_open(self.file_path) as source:
+                for buf in source:
+                    # audioread delivers interleaved 16-bit PCM
+                    piece = np.frombuffer(buf, dtype="<i2").astype(np.float32) / 32768.0
+                    piece = piece.reshape(-1, self.channels)
+                    self.frames_read += len(piece)
+                    yield self._downmix(piece)
+
+    def _resample(self, pieces):
+        if self.sr == self.native_sr:
+            yield from pieces
+            return
+
+        decimator = StreamDecimator(self.native_sr, self.target_sr, self.decimation,
+                                    None if self.mono else self.channels)
+        for piece in pieces:
+            out = decimator.process(piece)
+            if len(out):
+                yield out
+        out = decimator.flush()
+        if len(out):
+            yield out
+
+    def _reblock(self, pieces):
+        # Pack arbitrary pieces into blocks of block_size new samples, each
+        # prefixed with the last `overlap` samples of the previous block
+        buf = np.empty((self.block_size + self.overlap,) + self.frame_shape, dtype=np.float32)
+        filled = 0
+        overlap = 0
+        start = int(self.start * self.sr / self.native_sr)
+        for piece in pieces:
+            pos = 0
+            while pos < len(piece):
+                n = min(len(piece) - pos, overlap + self.block_size - filled)
+                buf[filled:filled + n] = piece[pos:pos + n]
+                filled += n
+                pos += n
+                if filled == overlap + self.block_size:
+                    yield AudioBlock(start, buf[:filled], overlap)
+                    # Start the next block with the tail of this one
+                    overlap = min(self.overlap, filled)
+                    next_buf = np.empty_like(buf)
+                    next_buf[:overlap] = buf[filled - overlap:filled]
+                    start += filled - overlap
+                    buf = next_buf
+                    filled = overlap
+        if filled > overlap:
+            yield AudioBlock(start, buf[:filled], overlap)
+
+
+def stream_audio(file_path, sr=None, block_duration=DEFAULT_BLOCK_DURATION,
+                 overlap_duration=DEFAULT_OVERLAP_DURATION, start=0, mono=True, decimation=DEFAULT_DECIMATION):
+    """
+    Convenience wrapper returning an iterable AudioStream.
+    """
+    return AudioStream(file_path, sr, block_duration, overlap_duration, start, mono, decimation)
@@ -0,0 +1,260 @@
+"""
+Command-line batch pop detection over directories of recordings.
+
+Files are spread across a process pool (decoding and detection are CPU-bound,
+so threads would be limited by the GIL) and results are streamed to a JSONL
+or CSV file as soon as each file finishes.
+
+Example:
+    python batch_analyzer.py recordings/ "archive/**/*.mp3" -o pops.jsonl --workers 8 --timeout 300
+
+With --results-db, nightly re-runs only pay for new or changed audio:
+    python batch_analyzer.py archive/ -o pops.jsonl --results-db pops.sqlite
+
+With --event-table, every event is also kept in a columnar table that can be
+queried by time range and amplitude later (see event_table.py):
+    python batch_analyzer.py archive/ -o pops.jsonl --event-table pops.npz
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import signal
+import sys
+import time
+
+import instrumentation
+import pop_detection
+import resampling
+import results_store
+from audio_cache import DEFAULT_MAX_BYTES, AudioCache, file_hash
+from audio_files import find_audio_files
+from event_table import EventTable
+
+
+class AnalysisTimeout(BaseException):
+    # Like KeyboardInterrupt, not an Exception, so no "except Exception" (or OSError, as
+    # TimeoutError would be) in the decoding and caching code can swallow it
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise AnalysisTimeout("analysis timed out")
+
+
+def analyze_file(file_path, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap=pop_detection.DEFAULT_MERGE_GAP,
+                 sr=None, timeout=None, cache_dir=None, cache_max_bytes=None, mode=pop_detection.DEFAULT_MODE,
+                 previous=None, track=False, mono=True, decimation=resampling.DEFAULT_DECIMATION):
+    """
+    Analyze a single file in a worker process and return a JSON-serializable
+    result dict. Errors and timeouts are reported in the result rather than
+    raised so one bad file never stops the batch.
+    Without a cache_dir the file is streamed (unless the decimation mode
+    needs the whole signal); with one, the decoded audio is taken from (or
+    added to) the shared on-disk cache.
+    With track, the result also carries what results_store.ResultsStore
+    needs. previous is the stored result for the same parameters: unchanged
+    files are skipped and grown files are only analyzed from the old end on.
+    With mono=False every channel is analyzed separately instead of a
+    downmix, and events carry the channel they were found on.
+    """
+    start_time = time.perf_counter()
+    result = {"file": file_path, "status": "ok", "sample_rate": None, "events": []}
+    profiler = instrumentation.start_profile()
+    if timeout:
+        # Interrupt the worker itself; the pool stays usable for the next file
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        st = os.stat(file_path)
+        action, fingerprint = "analyze", None
+        if previous is not None:
+            action, fingerprint = results_store.plan_update(file_path, previous, mode)
+
+        frames = signature = None
+        if action == "skip":
+            result["sample_rate"] = previous["sample_rate"]
+            result["events"] = previous["events"]
+            fingerprint, frames, signature = previous["fingerprint"], previous["frames"], previous["signature"]
+        elif action == "append":
+            start, kept = results_store.resume_point(previous["events"], previous["frames"], previous["sample_rate"],
+                                                     merge_gap)
+            stream = pop_detection.open_detection_stream(file_path, sr=sr, mode=mode, start=start, mono=mono)
+            events = pop_detection.detect_pops_in_stream(stream, stream.sr, threshold, merge_gap, mode)
+            result["sample_rate"] = stream.sr
+            result["events"] = kept + [event._asdict() for event in events]
+            frames = stream.frames_read
+        elif cache_dir or (sr is not None and decimation not in resampling.STREAMING_MODES):
+            cache = AudioCache(cache_dir, cache_max_bytes or DEFAULT_MAX_BYTES) if cache_dir else None
+            events, y, result["sample_rate"] = pop_detection.detect_pops_in_file(
+                file_path, threshold=threshold, sr=sr, merge_gap=merge_gap, cache=cache, mode=mode, mono=mono,
+                decimation=decimation)
+            result["events"] = [event._asdict() for event in events]
+            frames = len(y) if sr is None else None
+        else:
+            stream = pop_detection.open_detection_stream(file_path, sr=sr, mode=mode, mono=mono,
+                                                         decimation=decimation)
+            events = pop_detection.detect_pops_in_stream(stream, stream.sr, threshold, merge_gap, mode)
+            result["sample_rate"] = stream.sr
+            result["events"] = [event._asdict() for event in events]
+            # Resuming later is only possible at the native rate
+            frames = stream.frames_read if sr is None else None
+
+        if track:
+            if action != "skip":
+                if action == "analyze" and fingerprint is None:
+                    fingerprint = file_hash(file_path)
+                signature = results_store.content_signature(file_path, frames) if frames else None
+            result["update"] = action
+            result["store"] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "fingerprint": fingerprint,
+                               "frames": frames if signature else None, "signature": signature}
+    except AnalysisTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        instrumentation.stop_profile(profiler, file_path)
+    result["elapsed"] = time.perf_counter() - start_time
+    return result
+
+
+class ResultWriter:
+    """
+    Append results to a JSONL file (one record per file) or a CSV file (one
+    row per pop event), flushing after every file.
+    """
+    CSV_FIELDS = ["file", "onset", "offset", "peak", "duration", "channel"]
+
+    def __init__(self, output, output_format):
+        self.output_format = output_format
+        self.stream = sys.stdout if output == "-" else open(output, "w", newline="")
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=self.CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, result):
+        if self.output_format == "csv":
+            for event in result["events"]:
+                self.csv_writer.writerow({"file": result["file"], **event})
+        else:
+            self.stream.write(json.dumps(result) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+def run_batch(files, writer, workers=None, threshold=pop_detection.DEFAULT_THRESHOLD,
+              merge_gap=pop_detection.DEFAULT_MERGE_GAP, sr=None, timeout=None, cache_dir=None, cache_max_bytes=None,
+              mode=pop_detection.DEFAULT_MODE, store=None, mono=True, decimation=resampling.DEFAULT_DECIMATION,
+              event_table=None):
+    """
+    Analyze files across a process pool, writing each result as it completes.
+    With a results_store.ResultsStore, unchanged files are answered from the
+    store and grown files are only analyzed from where the last run stopped.
+    With an event_table.EventTable, the events of every analyzed file replace
+    that file's earlier events in the table.
+    Returns a dict of status counts (and skipped/appended counts with a store).
+    """
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    params = results_store.params_key(threshold, merge_gap, sr, mode, mono, decimation)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for file_path in files:
+            previous = store.get(file_path, params) if store is not None else None
+            if previous is not None and store.is_current(previous, file_path):
+                # Unchanged since the last run: no need to involve a worker
+                writer.write({"file": file_path, "status": "ok", "sample_rate": previous["sample_rate"],
+                              "events": previous["events"], "update": "skip", "elapsed": 0.0})
+                if event_table is not None:
+                    event_table.add_result(file_path, previous["sample_rate"], previous["events"])
+                counts["ok"] += 1
+                counts["skip"] = counts.get("skip", 0) + 1
+                continue
+            futures.append(executor.submit(analyze_file, file_path, threshold, merge_gap, sr, timeout, cache_dir,
+                                           cache_max_bytes, mode, previous, store is not None, mono, decimation))
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                stored = result.pop("store", None)
+                if stored is not None and result["status"] == "ok":
+                    store.save(result["file"], params, sample_rate=result["sample_rate"], events=result["events"],
+                               **stored)
+                    counts[result["update"]] = counts.get(result["update"], 0) + 1
+                writer.write(result)
+                if event_table is not None and result["status"] == "ok":
+                    event_table.add_result(result["file"], result["sample_rate"], result["events"])
+                counts[result["status"]] += 1
+                if result["status"] != "ok":
+                    print(f"{result['file']}: {result['status']} {result.get('error', '')}", file=sys.stderr)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            raise
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect pop sounds in many audio files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="Output format (default: from the output file extension, else jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--timeout", type=float, help="Per-file timeout in seconds")
+    parser.add_argument("--threshold", type=float, default=pop_detection.DEFAULT_THRESHOLD,
+                        help="Amplitude threshold, or transient score threshold (0-1) in spectral mode")
+    parser.add_argument("--mode", choices=pop_detection.DETECTION_MODES, default=pop_detection.DEFAULT_MODE,
+                        help="Detector: raw amplitude, or spectral transient score")
+    parser.add_argument("--merge-gap", type=float, default=pop_detection.DEFAULT_MERGE_GAP,
+                        help="Merge pops closer than this many seconds")
+    parser.add_argument("--sr", type=int, help="Resample to this rate before detection (default: native rate)")
+    parser.add_argument("--decimation", choices=resampling.DECIMATION_MODES, default=resampling.DEFAULT_DECIMATION,
+                        help="How --sr reduces the rate: speed vs. click fidelity, see resampling.py")
+    parser.add_argument("--multichannel", action="store_true",
+                        help="Analyze every channel separately instead of a mono downmix")
+    parser.add_argument("--cache-dir", help="Cache decoded audio in this directory (default: stream without caching)")
+    parser.add_argument("--results-db",
+                        help="SQLite store of earlier results: skip unchanged files, only analyze appended audio")
+    parser.add_argument("--event-table", help="Also add all events to this columnar event table (.npz)")
+    parser.add_argument("--cache-max-gb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help="Maximum cache size in GiB")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    # Before the pool starts, so the workers inherit the settings
+    instrumentation.configure_from_args(args)
+
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    files = find_audio_files(args.inputs)
+    print(f"Analyzing {len(files)} file(s) with {args.workers} worker(s)", file=sys.stderr)
+
+    start_time = time.perf_counter()
+    writer = ResultWriter(args.output, output_format)
+    store = results_store.ResultsStore(args.results_db) if args.results_db else None
+    event_table = EventTable.open(args.event_table) if args.event_table else None
+    try:
+        counts = run_batch(files, writer, args.workers, args.threshold, args.merge_gap, args.sr, args.timeout,
+                           args.cache_dir, int(args.cache_max_gb * 1024 ** 3), args.mode, store,
+                           not args.multichannel, args.decimation, event_table)
+    finally:
+        writer.close()
+        if event_table is not None:
+            event_table.save(args.event_table)
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"Done in {elapsed:.1f}s: {counts['ok']} ok, {counts['error']} error(s), {counts['timeout']} timeout(s)",
+          file=sys.stderr)
+    if store is not None:
+        print(f"Results store: {counts.get('skip', 0)} unchanged, {counts.get('append', 0)} appended, "
+              f"{counts.get('analyze', 0)} analyzed", file=sys.stderr)
+    return 0 if counts["error"] == 0 and counts["timeout"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
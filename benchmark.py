@@ -0,0 +1,220 @@
+"""
+Reproducible performance benchmarks for the decode and detection paths.
+
+Synthetic recordings of configurable length, sample rate and pop density are
+generated (with a fixed seed) and written to WAV, and the bundled MP3 fixtures
+are included as real-world cases. Each stage is timed separately:
+
+    decode      file -> float32 samples at the native rate
+    resample    native rate -> --target-sr with --decimation (see resampling.py)
+    threshold   np.abs(y) > threshold
+    grouping    above-threshold indices -> pop events
+    plot_prep   min/max peak pyramid + one screen-width envelope
+
+For every stage the report gives the best wall time over --repeat runs,
+throughput in seconds of audio per second, and the peak and retained bytes
+allocated (via tracemalloc, measured in a separate untimed run). The process
+peak RSS is reported for the whole run. Results go to JSON; pass --compare
+with an earlier report to print speed ratios.
+
+Example:
+    python benchmark.py --durations 60 600 --pop-rate 2 -o bench.json --compare previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import pop_detection
+import resampling
+from waveform_pyramid import PeakPyramid
+
+FIXTURES = ["pop_2.mp3", "test_pop.mp3"]
+STAGES = ["decode", "resample", "threshold", "grouping", "plot_prep"]
+
+
+def make_synthetic_recording(duration, sr, pop_rate=1.0, noise_level=0.05, seed=0):
+    """
+    Generate background noise with short decaying clicks.
+    pop_rate is the average number of pops per second. Returns (y, onsets)
+    with onsets in samples.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = (rng.standard_normal(n) * noise_level).astype(np.float32)
+
+    n_pops = rng.poisson(pop_rate * duration)
+    onsets = np.sort(rng.integers(0, max(1, n - sr // 100), n_pops))
+    click_length = max(1, sr // 500)  # 2 ms
+    click = np.exp(-np.arange(click_length) / (click_length / 5)).astype(np.float32)
+    for onset, amplitude, sign in zip(onsets, rng.uniform(0.5, 0.95, n_pops), rng.choice([-1, 1], n_pops)):
+        y[onset:onset + click_length] += sign * amplitude * click[:n - onset]
+    np.clip(y, -1, 1, out=y)
+    return y, onsets
+
+
+def measure(func, repeat):
+    """
+    Return (result, best_seconds, alloc_peak_bytes, alloc_retained_bytes).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    # Allocation profile in a separate run so tracing overhead does not skew timings
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak, retained
+
+
+def benchmark_file(name, file_path, args):
+    stages = {}
+
+    def record(stage, func, audio_seconds):
+        result, seconds, alloc_peak, alloc_retained = measure(func, args.repeat)
+        stages[stage] = {
+            "seconds": seconds,
+            "throughput": audio_seconds / seconds if seconds > 0 else None,
+            "alloc_peak_bytes": alloc_peak,
+            "alloc_retained_bytes": alloc_retained,
+        }
+        return result
+
+    y, sr = record("decode", lambda: pop_detection.load_audio(file_path, sr=None), 0.0)
+    audio_seconds = len(y) / sr
+    stages["decode"]["throughput"] = audio_seconds / stages["decode"]["seconds"]
+
+    record("resample", lambda: resampling.decimate(y, sr, args.target_sr, args.decimation), audio_seconds)
+
+    abs_y = np.abs(y)
+    pop_indices = record("threshold", lambda: np.flatnonzero(np.abs(y) > args.threshold), audio_seconds)
+    merge_gap_samples = int(args.merge_gap * sr)
+    runs = record("grouping",
+                  lambda: pop_detection.group_pop_indices(abs_y, pop_indices, merge_gap_samples), audio_seconds)
+    record("plot_prep", lambda: PeakPyramid(y).envelope(width=args.plot_width), audio_seconds)
+
+    return {
+        "name": name,
+        "audio_seconds": audio_seconds,
+        "sample_rate": sr,
+        "samples_above_threshold": int(len(pop_indices)),
+        "events": int(len(runs[0])),
+        "stages": stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def compare(report, baseline):
+    """
+    Print per-stage speed ratios (baseline time / current time; >1 is faster).
+    """
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in report["cases"]:
+        old = baseline_cases.get(case["name"])
+        if old is None:
+            continue
+        ratios = []
+        for stage in STAGES:
+            if stage in case["stages"] and stage in old["stages"]:
+                ratio = old["stages"][stage]["seconds"] / case["stages"][stage]["seconds"]
+                ratios.append(f"{stage} {ratio:.2f}x")
+        print(f"{case['name']}: " + ", ".join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark decode, detection and plot preparation.")
+    parser.add_argument("--durations", type=float, nargs="*", default=[60.0, 600.0],
+                        help="Lengths of the synthetic recordings in seconds")
+    parser.add_argument("--sr", type=int, default=44100, help="Sample rate of the synthetic recordings")
+    parser.add_argument("--pop-rate", type=float, default=1.0, help="Average pops per second in synthetic audio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-fixtures", action="store_true", help="Skip the bundled MP3 files")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is reported)")
+    parser.add_argument("--threshold", type=float, default=pop_detection.DEFAULT_THRESHOLD)
+    parser.add_argument("--merge-gap", type=float, default=pop_detection.DEFAULT_MERGE_GAP)
+    parser.add_argument("--target-sr", type=int, default=11025, help="Target rate for the resample stage")
+    parser.add_argument("--decimation", choices=resampling.DECIMATION_MODES, default=resampling.DEFAULT_DECIMATION,
+                        help="Rate reduction used by the resample stage")
+    parser.add_argument("--plot-width", type=int, default=1000, help="Envelope width in pixels")
+    parser.add_argument("-o", "--output", default="-", help="JSON report path (default: stdout)")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    import soundfile as sf
+
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Pay one-time import and initialization costs before anything is timed
+        warmup_path = os.path.join(tmp_dir, "warmup.wav")
+        sf.write(warmup_path, make_synthetic_recording(0.1, args.sr)[0], args.sr, subtype="FLOAT")
+        benchmark_file("warmup", warmup_path, argparse.Namespace(**{**vars(args), "repeat": 1}))
+
+        for duration in args.durations:
+            name = f"synthetic-{duration:g}s-{args.sr}Hz-{args.pop_rate:g}pps"
+            y, _ = make_synthetic_recording(duration, args.sr, args.pop_rate, seed=args.seed)
+            file_path = os.path.join(tmp_dir, name + ".wav")
+            sf.write(file_path, y, args.sr, subtype="FLOAT")
+            del y
+            print(f"Benchmarking {name}", file=sys.stderr)
+            cases.append(benchmark_file(name, file_path, args))
+
+    if not args.no_fixtures:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for fixture in FIXTURES:
+            file_path = os.path.join(base_dir, fixture)
+            if os.path.exists(file_path):
+                print(f"Benchmarking {fixture}", file=sys.stderr)
+                cases.append(benchmark_file(fixture, file_path, args))
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "peak_rss_bytes": peak_rss_bytes(),
+        "cases": cases,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
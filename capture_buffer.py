@@ -0,0 +1,155 @@
+"""
+Append-only capture buffer for live recording.
+
+Audio is written into fixed-size chunks that are allocated once and never
+moved, so appending a block costs O(block) however long the session runs
+(np.append copies the whole recording on every block). Chunks can optionally
+live in memory-mapped files for long sessions, and a retention window can
+bound how much audio is kept.
+
+There is one writer (the audio callback) and any number of readers. The
+writer fills a chunk first and only then publishes the new frame count, so
+readers never see partially written frames and no lock is needed.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from audio_stream import AudioBlock
+
+DEFAULT_CHUNK_DURATION = 10.0  # seconds per chunk
+
+
+class CaptureBuffer:
+    def __init__(self, sr, channels=1, chunk_duration=DEFAULT_CHUNK_DURATION, retention=None, spill_dir=None,
+                 dtype=np.float32):
+        self.sr = sr
+        self.channels = channels
+        self.chunk_frames = max(1, int(chunk_duration * sr))
+        self.dtype = np.dtype(dtype)
+        # Keep at most this many seconds of audio (None keeps everything)
+        self.retention_frames = None if retention is None else int(retention * sr)
+        self.spill_dir = spill_dir
+
+        self._chunks = {}  # chunk number -> (chunk_frames, channels) array
+        self._spill_paths = {}
+        self.frames_written = 0  # published after each write
+        self.first_frame = 0  # oldest frame still retained
+
+    def _allocate_chunk(self, number):
+        shape = (self.chunk_frames, self.channels)
+        if self.spill_dir is None:
+            chunk = np.empty(shape, dtype=self.dtype)
+        else:
+            fd, path = tempfile.mkstemp(dir=self.spill_dir, suffix=".pcm")
+            os.close(fd)
+            chunk = np.memmap(path, dtype=self.dtype, mode="w+", shape=shape)
+            self._spill_paths[number] = path
+        self._chunks[number] = chunk
+        return chunk
+
+    def _release_chunk(self, number):
+        self._chunks.pop(number, None)
+        path = self._spill_paths.pop(number, None)
+        if path is not None:
+            os.remove(path)
+
+    def write(self, block):
+        """
+        Append a block of shape (frames,) or (frames, channels). Called from
+        the audio callback; never copies previously captured audio.
+        """
+        block = np.asarray(block).reshape(-1, self.channels)
+        position = self.frames_written
+        written = 0
+        while written < len(block):
+            number, offset = divmod(position + written, self.chunk_frames)
+            chunk = self._chunks.get(number)
+            if chunk is None:
+                chunk = self._allocate_chunk(number)
+            n = min(len(block) - written, self.chunk_frames - offset)
+            chunk[offset:offset + n] = block[written:written + n]
+            written += n
+        self.frames_written = position + written
+
+        # Drop whole chunks that fell out of the retention window
+        if self.retention_frames is not None:
+            first_frame = max(0, self.frames_written - self.retention_frames)
+            for number in range(self.first_frame // self.chunk_frames, first_frame // self.chunk_frames):
+                self._release_chunk(number)
+            self.first_frame = first_frame
+
+    def __len__(self):
+        return self.frames_written
+
+    @property
+    def duration(self):
+        return self.frames_written / self.sr
+
+    def segments(self, start=None, stop=None, channel=None):
+        """
+        Yield (start_frame, view) pairs covering frames [start, stop) without
+        copying. Views are (frames, channels), or 1-D for a single channel.
+        """
+        stop = self.frames_written if stop is None else min(stop, self.frames_written)
+        start = self.first_frame if start is None else max(start, self.first_frame)
+        position = start
+        while position < stop:
+            number, offset = divmod(position, self.chunk_frames)
+            chunk = self._chunks.get(number)
+            if chunk is None:
+                # Released by the retention window while we were reading
+                position = (number + 1) * self.chunk_frames
+                continue
+            n = min(stop - position, self.chunk_frames - offset)
+            view = chunk[offset:offset + n]
+            yield position, view if channel is None else view[:, channel]
+            position += n
+
+    def blocks(self, start=None, stop=None, channel=0):
+        """
+        Yield audio_stream.AudioBlock views of one channel (or of all
+        channels if channel is None), ready for
+        pop_detection.detect_pops_in_stream.
+        """
+        for position, view in self.segments(start, stop, channel):
+            yield AudioBlock(position, view, 0)
+
+    def read(self, start=None, stop=None, channel=0):
+        """
+        Return a contiguous copy of frames [start, stop) of one channel (or
+        all channels if channel is None). Prefer segments() for long ranges.
+        """
+        views = [view for _, view in self.segments(start, stop, channel)]
+        if not views:
+            shape = (0,) if channel is not None else (0, self.channels)
+            return np.zeros(shape, dtype=self.dtype)
+        return np.concatenate(views)
+
+    def take(self, channel=0):
+        """
+        Return all retained frames of one channel (or all channels if
+        channel is None) as one array and empty the buffer. Each chunk is
+        released as soon as it is copied, so memory grows by about one chunk
+        rather than doubling at the end of a long session.
+        """
+        shape = (self.frames_written - self.first_frame,) + ((self.channels,) if channel is None else ())
+        out = np.empty(shape, dtype=self.dtype)
+        for position, view in self.segments(channel=channel):
+            out[position - self.first_frame:position - self.first_frame + len(view)] = view
+            self._release_chunk(position // self.chunk_frames)
+        self.close()
+        return out
+
+    def latest(self, frames, channel=0):
+        """
+        Return a copy of the most recent `frames` frames.
+        """
+        return self.read(max(0, self.frames_written - frames), None, channel)
+
+    def close(self):
+        for number in list(self._chunks):
+            self._release_chunk(number)
+        self.frames_written = 0
+        self.first_frame = 0
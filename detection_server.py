@@ -0,0 +1,341 @@
+"""
+Resident pop detection service with a local HTTP API.
+
+Starting a Python process and importing librosa costs more than detecting
+pops in a short clip. The service keeps a pool of worker processes with the
+audio stack already imported and answers detection requests over HTTP on
+localhost (or a Unix socket):
+
+    python detection_server.py --port 8765 --workers 4
+
+    POST /detect      JSON body {"path": "clip.wav", "threshold": 0.4, ...}
+                      Detect pops in a file the server can read; also
+                      takes sr, decimation and multichannel.
+    POST /detect/pcm  Raw float32 little-endian samples (interleaved when
+                      channels > 1); sr, channels, threshold, merge_gap and
+                      mode are given in the query string.
+    GET  /health      Worker and queue status.
+
+Both detection endpoints return JSON with the events (see batch_analyzer).
+At most workers + queue_size jobs are accepted at a time; beyond that the
+server answers 503 with a Retry-After header instead of queueing without
+bound, so clients back off rather than pile up.
+"""
+import argparse
+import concurrent.futures
+import http.server
+import importlib
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+import batch_analyzer
+import instrumentation
+import pop_detection
+import resampling
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 16  # jobs waiting for a worker before requests are refused
+MAX_BODY_BYTES = 256 * 1024 * 1024
+RETRY_AFTER = 1  # seconds suggested to refused clients
+
+# Imported by every worker when it starts, so no request pays for them
+WORKER_MODULES = ["numpy", "soundfile", "soxr", "librosa.core.audio", "librosa.core.spectrum", "audio_stream",
+                  "spectral_detection"]
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+def _warm_worker():
+    # Ctrl+C is handled by the server process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in WORKER_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+
+def _ping(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def detect_pcm(data, sr, channels=1, threshold=pop_detection.DEFAULT_THRESHOLD,
+               merge_gap=pop_detection.DEFAULT_MERGE_GAP, mode=pop_detection.DEFAULT_MODE):
+    """
+    Detect pops in raw float32 little-endian samples; runs in a worker.
+    Returns a result dict like batch_analyzer.analyze_file.
+    """
+    start_time = time.perf_counter()
+    profiler = instrumentation.start_profile()
+    try:
+        y = np.frombuffer(data, dtype="<f4")
+        if channels > 1:
+            y = y[:len(y) // channels * channels].reshape(-1, channels)
+        events = pop_detection.detect_pops(y, sr, threshold, merge_gap, mode)
+    finally:
+        instrumentation.stop_profile(profiler, "pcm")
+    return {"status": "ok", "sample_rate": sr, "events": [event._asdict() for event in events],
+            "elapsed": time.perf_counter() - start_time}
+
+
+class DetectionService:
+    """
+    Warm process pool with a bounded number of accepted jobs.
+    """
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE, timeout=None, cache_dir=None,
+                 cache_max_bytes=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + queue_size
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.pending = 0
+        self.completed = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def warm_up(self, timeout=120):
+        """
+        Start every worker (and its imports) now rather than on the first
+        requests. Returns the number of workers that answered.
+        """
+        pids = set()
+        deadline = time.monotonic() + timeout
+        # A worker that is ready first may answer several pings, so ping until all have answered
+        while len(pids) < self.workers and time.monotonic() < deadline:
+            futures = [self.executor.submit(_ping, 0.05) for _ in range(self.workers)]
+            pids.update(future.result() for future in futures)
+        return len(pids)
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) on a worker and return its future, or raise ServiceBusy
+        if capacity jobs are already accepted.
+        """
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.refused += 1
+                raise ServiceBusy()
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._job_done(None)
+            raise
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += future is not None
+
+    def detect_file(self, file_path, threshold=pop_detection.DEFAULT_THRESHOLD,
+                    merge_gap=pop_detection.DEFAULT_MERGE_GAP, sr=None, mode=pop_detection.DEFAULT_MODE, mono=True,
+                    decimation=resampling.DEFAULT_DECIMATION):
+        return self.submit(batch_analyzer.analyze_file, file_path, threshold, merge_gap, sr, self.timeout,
+                           self.cache_dir, self.cache_max_bytes, mode, None, False, mono, decimation)
+
+    def detect_pcm(self, data, sr, channels=1, threshold=pop_detection.DEFAULT_THRESHOLD,
+                   merge_gap=pop_detection.DEFAULT_MERGE_GAP, mode=pop_detection.DEFAULT_MODE):
+        return self.submit(detect_pcm, data, sr, channels, threshold, merge_gap, mode)
+
+    def status(self):
+        with self._lock:
+            return {"status": "ok", "workers": self.workers, "pending": self.pending, "capacity": self.capacity,
+                    "completed": self.completed, "refused": self.refused}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def _detector_params(params):
+    # Shared request parameters, validated; raises ValueError or TypeError with a message for the client
+    mode = params.get("mode", pop_detection.DEFAULT_MODE)
+    if mode not in pop_detection.DETECTION_MODES:
+        raise ValueError(f"mode must be one of {', '.join(pop_detection.DETECTION_MODES)}")
+    return {"threshold": float(params.get("threshold", pop_detection.DEFAULT_THRESHOLD)),
+            "merge_gap": float(params.get("merge_gap", pop_detection.DEFAULT_MERGE_GAP)),
+            "mode": mode}
+
+
+def _positive_int(params, name, default=None):
+    # Integer request parameter that must be at least 1, e.g. a sample rate or channel count
+    value = params.get(name, default)
+    if value is None:
+        raise ValueError(f"{name} is required")
+    value = int(value)
+    if value < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+
+class DetectionRequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "PopDetector/1.0"
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == "/health":
+            self._send_json(200, self.server.service.status())
+        else:
+            self._send_json(404, {"status": "error", "error": "not found"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {"status": "error", "error": "invalid Content-Length"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"status": "error", "error": f"request body over {MAX_BODY_BYTES} bytes"})
+            return
+        body = self.rfile.read(length)
+        service = self.server.service
+        try:
+            if url.path == "/detect":
+                params = json.loads(body or b"{}")
+                if not isinstance(params, dict):
+                    raise ValueError("request body must be a JSON object")
+                if not isinstance(params.get("path"), str):
+                    raise ValueError("path is required")
+                sr = None if params.get("sr") is None else _positive_int(params, "sr")
+                decimation = params.get("decimation", resampling.DEFAULT_DECIMATION)
+                if decimation not in resampling.DECIMATION_MODES:
+                    raise ValueError(f"decimation must be one of {', '.join(resampling.DECIMATION_MODES)}")
+                future = service.detect_file(params["path"], sr=sr, mono=not params.get("multichannel"),
+                                             decimation=decimation, **_detector_params(params))
+            elif url.path == "/detect/pcm":
+                params = dict(urllib.parse.parse_qsl(url.query))
+                future = service.detect_pcm(body, _positive_int(params, "sr"), _positive_int(params, "channels", 1),
+                                            **_detector_params(params))
+            else:
+                self._send_json(404, {"status": "error", "error": "not found"})
+                return
+        except ServiceBusy:
+            self._send_json(503, {"status": "busy", "error": "detection queue is full"},
+                            {"Retry-After": str(RETRY_AFTER)})
+            return
+        except (TypeError, ValueError) as e:  # includes malformed JSON and e.g. "threshold": null
+            self._send_json(400, {"status": "error", "error": str(e)})
+            return
+
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        self._send_json(200 if result["status"] == "ok" else 422, result)
+
+    def _send_json(self, code, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.log_date_time_string()} {format % args}\n")
+
+
+class DetectionHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, DetectionRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+class DetectionUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, verbose=False):
+        super().__init__(path, DetectionRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def request_detection(url, path=None, pcm=None, sr=None, channels=1, timeout=None, **params):
+    """
+    Client helper: detect pops in a file (path) or in an array of samples
+    (pcm, with sr) through a running server at url, e.g.
+    "http://127.0.0.1:8765". Returns the decoded JSON result; a refused or
+    failed request raises urllib.error.HTTPError.
+    """
+    if pcm is not None:
+        query = urllib.parse.urlencode({"sr": sr, "channels": channels, **params})
+        data = np.ascontiguousarray(pcm, dtype="<f4").tobytes()
+        request = urllib.request.Request(f"{url}/detect/pcm?{query}", data=data,
+                                         headers={"Content-Type": "application/octet-stream"})
+    else:
+        data = json.dumps({"path": path, "sr": sr, **params}).encode()
+        request = urllib.request.Request(f"{url}/detect", data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve pop detection to local clients from warm worker processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+    parser.add_argument("--unix-socket", help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Jobs that may wait for a worker before requests get 503")
+    parser.add_argument("--timeout", type=float, help="Per-file timeout in seconds")
+    parser.add_argument("--cache-dir", help="Cache decoded audio in this directory (default: stream files)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.configure_from_args(args)
+
+    service = DetectionService(args.workers, args.queue_size, args.timeout, args.cache_dir)
+    start_time = time.perf_counter()
+    workers = service.warm_up()
+    print(f"{workers} worker(s) ready in {time.perf_counter() - start_time:.1f}s", file=sys.stderr)
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+        server = DetectionUnixServer(args.unix_socket, service, args.verbose)
+        print(f"Listening on {args.unix_socket}", file=sys.stderr)
+    else:
+        server = DetectionHTTPServer((args.host, args.port), service, args.verbose)
+        print(f"Listening on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Columnar store of detected pops across many files.
+
+EventTable keeps one NumPy column per field (onset and duration in samples,
+peak, channel, file id) in growable arrays, so appending is amortized O(1)
+and millions of events take 26 bytes each. Files are listed once with
+their sample rate. The table is kept sorted by (file, onset), so a time-range
+query is two binary searches per file. Amplitude queries over the whole
+table use a peak-sorted index that is built on first use. Tables are saved
+as a single .npz file.
+
+Re-analyzing a file replaces its events. The old rows are only hidden at
+first and are dropped when the table is saved.
+
+Example (after batch_analyzer.py ... --event-table pops.npz):
+    python event_table.py pops.npz --summary
+    python event_table.py pops.npz --file archive/2023-05-01.wav --start 600 --stop 660
+    python event_table.py pops.npz --min-peak 0.9 -o loud.csv
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+import pop_detection
+
+COLUMNS = {"onset": np.int64, "duration": np.int64, "peak": np.float32, "channel": np.int16, "file_id": np.int32}
+INITIAL_CAPACITY = 1024
+
+
+class EventTable:
+    def __init__(self):
+        self.columns = {name: np.empty(INITIAL_CAPACITY, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.size = 0  # rows stored, including hidden ones
+        self.hidden_rows = 0  # rows of replaced files, dropped on save
+        self.file_paths = []  # file id -> absolute path
+        self.sample_rates = []  # file id -> sample rate of its onsets/durations
+        self.row_counts = []  # file id -> number of rows
+        self.live = []  # file id -> False once the file's events were replaced
+        self.file_ids = {}  # absolute path -> live file id
+        self._sorted = True
+        self._peak_order = None
+        self._file_starts = None
+
+    def __len__(self):
+        # Events of the files' current results
+        return self.size - self.hidden_rows
+
+    def column(self, name):
+        # View of the filled part of a column
+        return self.columns[name][:self.size]
+
+    def add_file(self, file_path, sample_rate):
+        """
+        Register a file and return its id. If the file is already in the
+        table, its old events are hidden and a new id is returned. Files are
+        identified by absolute path, like in results_store.
+        """
+        file_path = os.path.abspath(file_path)
+        old_id = self.file_ids.get(file_path)
+        if old_id is not None:
+            self.live[old_id] = False
+            self.hidden_rows += self.row_counts[old_id]
+        file_id = len(self.file_paths)
+        self.file_paths.append(file_path)
+        self.sample_rates.append(sample_rate)
+        self.row_counts.append(0)
+        self.live.append(True)
+        self.file_ids[file_path] = file_id
+        return file_id
+
+    def _reserve(self, n):
+        if self.size + n <= len(self.columns["onset"]):
+            return
+        capacity = max(self.size + n, 2 * len(self.columns["onset"]))
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append_runs(self, file_id, onsets, offsets, peaks, channel=0):
+        """
+        Append (onsets, offsets, peaks) sample runs as produced by
+        pop_detection.find_pop_runs, without creating Python objects.
+        """
+        n = len(onsets)
+        if n == 0:
+            return
+        self._reserve(n)
+        end = self.size + n
+        self.columns["onset"][self.size:end] = onsets
+        self.columns["duration"][self.size:end] = np.asarray(offsets) - np.asarray(onsets)
+        self.columns["peak"][self.size:end] = peaks
+        self.columns["channel"][self.size:end] = channel
+        self.columns["file_id"][self.size:end] = file_id
+        self._note_append(self.size, end)
+        self.size = end
+        self.row_counts[file_id] += n
+
+    def append_events(self, file_id, events):
+        """
+        Append pop_detection.PopEvent tuples or their dicts (as written by
+        batch_analyzer) for a file.
+        """
+        n = len(events)
+        if n == 0:
+            return
+        sr = self.sample_rates[file_id]
+        if isinstance(events[0], dict):
+            fields = [[event[name] for event in events] for name in ("onset", "offset", "peak")]
+            channels = [event.get("channel", 0) for event in events]
+        else:
+            fields = [[getattr(event, name) for event in events] for name in ("onset", "offset", "peak")]
+            channels = [event.channel for event in events]
+        onsets = np.round(np.asarray(fields[0]) * sr).astype(np.int64)
+        offsets = np.round(np.asarray(fields[1]) * sr).astype(np.int64)
+        self.append_runs(file_id, onsets, offsets, fields[2], channels)
+
+    def add_result(self, file_path, sample_rate, events):
+        """
+        Replace the events of file_path with events (see append_events).
+        """
+        self.append_events(self.add_file(file_path, sample_rate), events)
+
+    def _note_append(self, start, end):
+        # Appending keeps the (file, onset) order unless the new rows go backwards
+        self._peak_order = None
+        self._file_starts = None
+        if not self._sorted:
+            return
+        file_id = self.columns["file_id"][start:end]
+        onset = self.columns["onset"][start:end]
+        if start > 0:
+            file_id = self.columns["file_id"][start - 1:end]
+            onset = self.columns["onset"][start - 1:end]
+        same_file = file_id[1:] == file_id[:-1]
+        if np.any(file_id[1:] < file_id[:-1]) or np.any(same_file & (onset[1:] < onset[:-1])):
+            self._sorted = False
+
+    def _ensure_sorted(self):
+        if self._sorted:
+            return
+        order = np.lexsort((self.column("onset"), self.column("file_id")))
+        for name in COLUMNS:
+            self.columns[name][:self.size] = self.column(name)[order]
+        self._sorted = True
+        self._peak_order = None
+        self._file_starts = None
+
+    def _file_range(self, file_id):
+        # Rows of a file; the boundaries of all files are found in one vectorized search
+        if self._file_starts is None or len(self._file_starts) <= len(self.file_paths):
+            file_ids = np.arange(len(self.file_paths) + 1, dtype=np.int32)
+            self._file_starts = np.searchsorted(self.column("file_id"), file_ids).tolist()
+        return self._file_starts[file_id], self._file_starts[file_id + 1]
+
+    def query(self, file_path=None, start=None, stop=None, min_peak=None, max_peak=None, channel=None):
+        """
+        Row indices (in (file, onset) order) of the events of a file (or of
+        all files) with onset in [start, stop) seconds, peak in
+        [min_peak, max_peak] and on the given channel; None means no limit.
+        """
+        self._ensure_sorted()
+        # Compare in the peak column's precision so both search paths agree
+        min_peak = None if min_peak is None else np.float32(min_peak)
+        max_peak = None if max_peak is None else np.float32(max_peak)
+        if file_path is not None:
+            file_id = self.file_ids.get(os.path.abspath(file_path))
+            file_ids = [] if file_id is None else [file_id]
+        elif start is not None or stop is not None:
+            file_ids = [file_id for file_id, live in enumerate(self.live) if live]
+        else:
+            file_ids = None
+
+        if file_ids is not None:
+            # Binary searches on the onset column within each file
+            ranges = []
+            onsets = self.column("onset")
+            for file_id in file_ids:
+                lo, hi = self._file_range(file_id)
+                sr = self.sample_rates[file_id]
+                if start is not None:
+                    lo += np.searchsorted(onsets[lo:hi], int(np.ceil(start * sr)), "left")
+                if stop is not None:
+                    hi = lo + np.searchsorted(onsets[lo:hi], int(np.ceil(stop * sr)), "left")
+                ranges.append(np.arange(lo, hi))
+            indices = np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+        elif min_peak is not None or max_peak is not None:
+            # Binary search on the peak-sorted index
+            order, sorted_peaks = self._peak_index()
+            lo = 0 if min_peak is None else np.searchsorted(sorted_peaks, min_peak, "left")
+            hi = len(order) if max_peak is None else np.searchsorted(sorted_peaks, max_peak, "right")
+            indices = np.sort(order[lo:hi])
+            min_peak = max_peak = None
+        else:
+            indices = np.arange(self.size)
+
+        mask = np.asarray(self.live, dtype=bool)[self.column("file_id")[indices]]
+        if min_peak is not None:
+            mask &= self.column("peak")[indices] >= min_peak
+        if max_peak is not None:
+            mask &= self.column("peak")[indices] <= max_peak
+        if channel is not None:
+            mask &= self.column("channel")[indices] == channel
+        return indices[mask]
+
+    def _peak_index(self):
+        if self._peak_order is None:
+            order = np.argsort(self.column("peak"), kind="stable")
+            self._peak_order = (order, self.column("peak")[order])
+        return self._peak_order
+
+    def counts_by_file(self, indices=None):
+        """
+        {path: number of events} for the given rows (default: all live rows).
+        """
+        indices = self.query() if indices is None else indices
+        counts = np.bincount(self.column("file_id")[indices], minlength=len(self.file_paths))
+        return {self.file_paths[file_id]: int(counts[file_id]) for file_id, live in enumerate(self.live) if live}
+
+    def rows(self, indices):
+        """
+        Yield rows as dicts with times in seconds, like batch_analyzer's CSV.
+        """
+        columns = {name: self.column(name)[indices].tolist() for name in COLUMNS}
+        rates = np.asarray(self.sample_rates, dtype=np.float64)
+        for onset, duration, peak, channel, file_id in zip(*(columns[name] for name in COLUMNS)):
+            sr = rates[file_id]
+            yield {"file": self.file_paths[file_id], "onset": onset / sr, "offset": (onset + duration) / sr,
+                   "peak": peak, "duration": duration / sr, "channel": channel}
+
+    def events(self, indices):
+        """
+        Return [(path, pop_detection.PopEvent)] for the given rows.
+        """
+        return [(row.pop("file"), pop_detection.PopEvent(**row)) for row in self.rows(indices)]
+
+    def export_csv(self, file, indices=None):
+        indices = self.query() if indices is None else indices
+        own_file = isinstance(file, str)
+        f = open(file, "w", newline="") if own_file else file
+        try:
+            writer = csv.DictWriter(f, fieldnames=["file", "onset", "offset", "peak", "duration", "channel"])
+            writer.writeheader()
+            writer.writerows(self.rows(indices))
+        finally:
+            if own_file:
+                f.close()
+
+    def compact(self):
+        """
+        Drop the rows of replaced files and renumber the files.
+        """
+        if all(self.live):
+            return
+        remap = np.cumsum(self.live) - 1
+        keep = np.asarray(self.live, dtype=bool)[self.column("file_id")]
+        for name in COLUMNS:
+            kept = self.column(name)[keep]
+            self.columns[name][:len(kept)] = kept
+        self.size = int(keep.sum())
+        self.columns["file_id"][:self.size] = remap[self.column("file_id")]
+        self.file_paths = [path for path, live in zip(self.file_paths, self.live) if live]
+        self.sample_rates = [sr for sr, live in zip(self.sample_rates, self.live) if live]
+        self.row_counts = [count for count, live in zip(self.row_counts, self.live) if live]
+        self.hidden_rows = 0
+        self.live = [True] * len(self.file_paths)
+        self.file_ids = {path: file_id for file_id, path in enumerate(self.file_paths)}
+        self._sorted = False
+        self._ensure_sorted()
+
+    def save(self, path):
+        """
+        Write the table to an .npz file (atomically).
+        """
+        self.compact()
+        self._ensure_sorted()
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, file_paths=np.array(self.file_paths, dtype=str),
+                 sample_rates=np.array(self.sample_rates, dtype=np.float64),
+                 **{name: self.column(name) for name in COLUMNS})
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        table = cls()
+        with np.load(path) as data:
+            table.file_paths = data["file_paths"].tolist()
+            table.sample_rates = [int(sr) if sr == int(sr) else float(sr) for sr in data["sample_rates"].tolist()]
+            table.size = len(data["onset"])
+            table.columns = {name: np.array(data[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        table.row_counts = np.bincount(table.column("file_id"), minlength=len(table.file_paths)).tolist()
+        table.live = [True] * len(table.file_paths)
+        table.file_ids = {path: file_id for file_id, path in enumerate(table.file_paths)}
+        return table
+
+    @classmethod
+    def open(cls, path):
+        # The table at path, or an empty one if it does not exist yet
+        return cls.load(path) if os.path.exists(path) else cls()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a pop event table written by batch_analyzer --event-table.")
+    parser.add_argument("table", help="Event table (.npz)")
+    parser.add_argument("--file", help="Only events of this file")
+    parser.add_argument("--start", type=float, help="Onset at or after this many seconds")
+    parser.add_argument("--stop", type=float, help="Onset before this many seconds")
+    parser.add_argument("--min-peak", type=float, help="Peak amplitude at least this")
+    parser.add_argument("--max-peak", type=float, help="Peak amplitude at most this")
+    parser.add_argument("--channel", type=int, help="Only events on this channel")
+    parser.add_argument("--summary", action="store_true", help="Print event counts per file instead of events")
+    parser.add_argument("-o", "--output", default="-", help="CSV output path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    table = EventTable.load(args.table)
+    indices = table.query(args.file, args.start, args.stop, args.min_peak, args.max_peak, args.channel)
+    if args.summary:
+        counts = table.counts_by_file(indices)
+        for path, count in counts.items():
+            print(f"{count}\t{path}")
+        print(f"{len(indices)} event(s) in {sum(1 for count in counts.values() if count)} file(s)", file=sys.stderr)
+    else:
+        table.export_csv(sys.stdout if args.output == "-" else args.output, indices)
+
+
+if __name__ == "__main__":
+    main()
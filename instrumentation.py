@@ -0,0 +1,236 @@
+"""
+Timing, counters and profiling hooks for the load / detect / plot stages.
+
+Instrumentation is off until configure() is called or one of these
+environment variables is set, so a slow production run can be diagnosed
+without code changes:
+
+    POP_METRICS_LOG   append one JSON line per finished stage span
+    POP_METRICS_FILE  keep Prometheus text-format totals in this file
+                      ("{pid}" is replaced by the process id, e.g. for
+                      the batch workers and a textfile collector)
+    POP_PROFILE_DIR   write a cProfile dump per batch job to this directory
+
+Each span records its wall time and the process's peak resident memory
+while it ran. The peak comes from the kernel's high-water mark (VmHWM),
+which is reset at the start of every span, so measuring costs two small
+/proc accesses rather than tracing allocations. It is process-wide: spans
+running concurrently on other threads share it. Where VmHWM cannot be
+reset, the peak since process start is reported instead.
+
+Example:
+    POP_METRICS_LOG=stages.jsonl python audio_analyzer2.0.py
+    python batch_analyzer.py archive/ -o pops.jsonl --metrics-file "metrics-{pid}.prom" --profile-dir profiles/
+"""
+import atexit
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+ENV_LOG = "POP_METRICS_LOG"
+ENV_METRICS_FILE = "POP_METRICS_FILE"
+ENV_PROFILE_DIR = "POP_PROFILE_DIR"
+
+enabled = False
+_log_path = None
+_metrics_path = None
+_profile_dir = None
+_atexit_registered = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_stages = {}  # stage -> {"calls", "seconds", "max_seconds", "peak_rss_bytes"}
+_counters = {}  # name -> total
+
+
+def configure(log_path=None, metrics_path=None, profile_dir=None):
+    """
+    Enable instrumentation with the given outputs (any may be None). The
+    settings are also exported to the environment so worker processes
+    started afterwards pick them up.
+    """
+    global enabled, _log_path, _metrics_path, _profile_dir, _atexit_registered
+    _log_path, _metrics_path, _profile_dir = log_path, metrics_path, profile_dir
+    enabled = bool(log_path or metrics_path or profile_dir)
+    for name, value in ((ENV_LOG, log_path), (ENV_METRICS_FILE, metrics_path), (ENV_PROFILE_DIR, profile_dir)):
+        if value:
+            os.environ[name] = value
+        else:
+            os.environ.pop(name, None)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    if metrics_path and not _atexit_registered:
+        atexit.register(write_metrics)
+        _atexit_registered = True
+
+
+def add_arguments(parser):
+    # Shared command-line options of the batch tools
+    parser.add_argument("--metrics-log", default=os.environ.get(ENV_LOG),
+                        help="Append a JSON line per timed stage to this file")
+    parser.add_argument("--metrics-file", default=os.environ.get(ENV_METRICS_FILE),
+                        help="Write Prometheus text-format stage metrics here ({pid} = process id)")
+    parser.add_argument("--profile-dir", default=os.environ.get(ENV_PROFILE_DIR),
+                        help="Write a cProfile dump per job to this directory")
+
+
+def configure_from_args(args):
+    configure(args.metrics_log, args.metrics_file, args.profile_dir)
+
+
+def _read_peak_rss():
+    # Peak resident set size in bytes
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"VmHWM:\s+(\d+) kB", f.read())
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kB on Linux
+    except (ImportError, OSError):
+        return 0
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """
+    Time a stage: with span("detect", mode="spectral") as fields: ...
+    fields (a dict) may be extended inside the block; it is written to the
+    JSON log with the timing. Spans nest; a parent's peak memory includes
+    its children's.
+    """
+    if not enabled:
+        yield fields
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    if stack:
+        # Keep the parent's peak so far before the high-water mark is reset
+        stack[-1]["peak"] = max(stack[-1]["peak"], _read_peak_rss())
+    _reset_peak_rss()
+    frame = {"peak": 0}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak = max(frame["peak"], _read_peak_rss())
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        _record(stage, seconds, peak, fields)
+        if not stack and _metrics_path:
+            write_metrics()
+
+
+def _record(stage, seconds, peak, fields):
+    with _lock:
+        totals = _stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_rss_bytes": 0})
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        totals["max_seconds"] = max(totals["max_seconds"], seconds)
+        totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], peak)
+        if _log_path:
+            record = {"time": time.time(), "pid": os.getpid(), "stage": stage, "seconds": seconds,
+                      "peak_rss_bytes": peak, **fields}
+            with open(_log_path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def count(name, value=1):
+    """
+    Add value to a counter, e.g. count("samples_processed", len(y)).
+    """
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    """
+    Return {"stages": {...}, "counters": {...}} with the totals so far.
+    """
+    with _lock:
+        return {"stages": {stage: dict(totals) for stage, totals in _stages.items()}, "counters": dict(_counters)}
+
+
+def prometheus_text():
+    """
+    The totals in Prometheus text exposition format.
+    """
+    metrics = snapshot()
+    lines = []
+    for name, key, kind, help_text in [
+            ("pop_stage_calls_total", "calls", "counter", "Number of times a stage ran"),
+            ("pop_stage_seconds_total", "seconds", "counter", "Total wall time spent in a stage"),
+            ("pop_stage_seconds_max", "max_seconds", "gauge", "Longest single run of a stage"),
+            ("pop_stage_peak_rss_bytes", "peak_rss_bytes", "gauge", "Highest peak resident memory during a stage")]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for stage, totals in sorted(metrics["stages"].items()):
+            lines.append(f'{name}{{stage="{stage}"}} {totals[key]}')
+    for counter, value in sorted(metrics["counters"].items()):
+        lines.append(f"# TYPE pop_{counter}_total counter")
+        lines.append(f"pop_{counter}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path=None):
+    """
+    Atomically (re)write the Prometheus text file.
+    """
+    path = path or _metrics_path
+    if not path or not (_stages or _counters):
+        return
+    path = path.replace("{pid}", str(os.getpid()))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(temp_path, path)
+
+
+def start_profile():
+    """
+    Start a cProfile profiler if a profile directory is configured, else
+    return None. Pass the result to stop_profile().
+    """
+    if not _profile_dir:
+        return None
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler, job_name):
+    """
+    Stop a profiler from start_profile() and dump its stats (readable with
+    pstats or snakeviz) as <profile dir>/<job>-<pid>-<time>.prof.
+    Returns the dump path, or None if profiling is off.
+    """
+    if profiler is None:
+        return None
+    profiler.disable()
+    name = re.sub(r"[^\w.-]", "_", os.path.basename(job_name))
+    path = os.path.join(_profile_dir, f"{name}-{os.getpid()}-{time.time_ns()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+configure(os.environ.get(ENV_LOG), os.environ.get(ENV_METRICS_FILE), os.environ.get(ENV_PROFILE_DIR))
@@ -0,0 +1,146 @@
+"""
+Background job scheduler for the Tk front-ends.
+
+Heavy work (decoding, detection, export) runs on worker threads so the Tk
+mainloop never blocks. Workers never touch Tk: progress and results are put
+on a queue that the scheduler drains from the Tk thread with root.after, and
+callbacks run there.
+
+Jobs are submitted under a key. Submitting a new job under a key that is
+already pending or running supersedes the old one: it is cancelled and its
+result is dropped. That way dragging the threshold slider only ever delivers
+the detection for the latest value.
+"""
+import concurrent.futures
+import queue
+import threading
+
+DEFAULT_POLL_INTERVAL = 50  # milliseconds between checks for job updates
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, scheduler, key, on_done=None, on_progress=None, on_error=None):
+        self.scheduler = scheduler
+        self.key = key
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self._cancelled = threading.Event()
+        self.future = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()  # only succeeds if the job has not started yet
+
+    def check_cancelled(self):
+        """
+        Raise JobCancelled if the job was cancelled or superseded; call this
+        between units of work.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, fraction, message=""):
+        # Safe to call from the worker thread; delivered on the Tk thread
+        self.scheduler._updates.put((self, "progress", (fraction, message)))
+
+
+class JobScheduler:
+    def __init__(self, root, max_workers=2, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._updates = queue.SimpleQueue()
+        self._current = {}  # key -> latest Job
+        self._polling = False
+
+    def submit(self, key, func, *args, on_done=None, on_progress=None, on_error=None):
+        """
+        Run func(job, *args) on a worker thread. on_done(result),
+        on_progress(fraction, message) and on_error(exception) are called on
+        the Tk thread, and only while this is still the latest job for key.
+        """
+        previous = self._current.get(key)
+        if previous is not None:
+            previous.cancel()
+
+        job = Job(self, key, on_done, on_progress, on_error)
+        self._current[key] = job
+        job.future = self.executor.submit(self._run, job, func, args)
+        self._start_polling()
+        return job
+
+    def _run(self, job, func, args):
+        try:
+            job.check_cancelled()
+            result = func(job, *args)
+            self._updates.put((job, "done", result))
+        except JobCancelled:
+            self._updates.put((job, "cancelled", None))
+        except Exception as e:
+            self._updates.put((job, "error", e))
+
+    def cancel(self, key=None):
+        """
+        Cancel the job for key, or every job if key is None.
+        """
+        keys = list(self._current) if key is None else [key]
+        for k in keys:
+            job = self._current.pop(k, None)
+            if job is not None:
+                job.cancel()
+
+    def is_busy(self, key=None):
+        jobs = self._current.values() if key is None else [self._current.get(key)]
+        return any(job is not None and not job.future.done() for job in jobs)
+
+    def _start_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        # Runs on the Tk thread; polling goes on even if a callback raises
+        try:
+            self._drain_updates()
+        finally:
+            if self._current:
+                self.root.after(self.poll_interval, self._poll)
+            else:
+                self._polling = False
+
+    def _drain_updates(self):
+        while True:
+            try:
+                job, kind, payload = self._updates.get_nowait()
+            except queue.Empty:
+                break
+            if job.cancelled or self._current.get(job.key) is not job:
+                continue  # superseded or cancelled: drop the update
+            if kind == "progress":
+                if job.on_progress is not None:
+                    job.on_progress(*payload)
+                continue
+            del self._current[job.key]
+            if kind == "cancelled":
+                continue
+            if kind == "done" and job.on_done is not None:
+                job.on_done(payload)
+            elif kind == "error":
+                if job.on_error is not None:
+                    job.on_error(payload)
+                else:
+                    print(f"Job '{job.key}' failed: {payload}")
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
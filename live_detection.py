@@ -0,0 +1,148 @@
+"""
+Incremental pop detection for live input.
+
+OnlinePopDetector processes a signal block by block and keeps the pop that
+may still be in progress across block boundaries, so old audio is never
+rescanned. A pop is emitted as soon as merge_gap seconds of quiet have
+followed it; with the default 20 ms gap and the 10 ms input blocks the live
+GUI requests, that keeps latency from capture to event well under 50 ms.
+
+LiveDetectionWorker runs the detector on a background thread, reading newly
+captured frames straight out of a capture_buffer.CaptureBuffer so the audio
+callback only has to write the block and wake the worker. Every channel of a
+multichannel capture gets its own detector, fed strided views of the
+captured chunks.
+"""
+import queue
+import threading
+
+import numpy as np
+
+import pop_detection
+
+DEFAULT_LIVE_MERGE_GAP = 0.02  # seconds; also the minimum emit latency
+
+
+class OnlinePopDetector:
+    def __init__(self, sr, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap=DEFAULT_LIVE_MERGE_GAP, channel=0):
+        self.sr = sr
+        self.channel = channel  # tagged onto emitted events
+        # May be changed at any time (e.g. from the threshold slider)
+        self.threshold = threshold
+        self.merge_gap_samples = int(merge_gap * sr)
+        self.position = 0  # frames processed so far
+        self.pending = None  # (onsets, offsets, peaks) of a pop that may continue
+
+    def process(self, block):
+        """
+        Scan the next block of samples and return the list of PopEvent that
+        are now complete.
+        """
+        runs = pop_detection.find_pop_runs(block, self.threshold, self.merge_gap_samples, self.position)
+        self.position += len(block)
+
+        if self.pending is not None:
+            runs = pop_detection.merge_pop_runs([self.pending, runs], self.merge_gap_samples)
+        if len(runs[0]) == 0:
+            self.pending = None
+            return []
+
+        # Every run but the last is followed by a long enough gap already; the
+        # last one is only complete once merge_gap of quiet has passed after it
+        if self.position - runs[1][-1] > self.merge_gap_samples:
+            complete, self.pending = runs, None
+        else:
+            complete = tuple(column[:-1] for column in runs)
+            self.pending = tuple(column[-1:] for column in runs)
+        return pop_detection.runs_to_events(complete, self.sr, self.channel)
+
+    def flush(self):
+        """
+        Return the pop still in progress (if any) at the end of the input.
+        """
+        if self.pending is None:
+            return []
+        events = pop_detection.runs_to_events(self.pending, self.sr, self.channel)
+        self.pending = None
+        return events
+
+
+class LiveDetectionWorker:
+    def __init__(self, capture, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap=DEFAULT_LIVE_MERGE_GAP,
+                 channel=None):
+        self.capture = capture
+        # A single channel, or every channel of the capture if channel is None
+        self.channels = list(range(capture.channels)) if channel is None else [channel]
+        self.detectors = [OnlinePopDetector(capture.sr, threshold, merge_gap, c) for c in self.channels]
+        # Completed PopEvent, consumed by the GUI thread
+        self.events = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @property
+    def threshold(self):
+        return self.detectors[0].threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        for detector in self.detectors:
+            detector.threshold = value
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        # Called from the audio callback after each write; just wakes the worker
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _process_new_frames(self):
+        # Only frames captured since the last pass are read, never old audio.
+        # All detectors advance together, so the first one's position is shared
+        position = self.detectors[0].position
+        start = max(position, self.capture.first_frame)
+        if start > position:
+            # Frames were dropped by the retention window before we got to them
+            for detector in self.detectors:
+                detector.position = start
+                detector.pending = None
+        for _, view in self.capture.segments(start, self.capture.frames_written, None):
+            view = np.asarray(view)
+            events = []
+            for detector in self.detectors:
+                events.extend(detector.process(view[:, detector.channel]))
+            for event in pop_detection.sort_events(events) if len(events) > 1 else events:
+                self.events.put(event)
+
+    def _run(self):
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            self._process_new_frames()
+        # Drain what was captured before stopping
+        self._process_new_frames()
+        events = []
+        for detector in self.detectors:
+            events.extend(detector.flush())
+        for event in pop_detection.sort_events(events):
+            self.events.put(event)
+
+    def drain(self):
+        """
+        Return all events emitted since the last call (non-blocking).
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
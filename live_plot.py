@@ -0,0 +1,123 @@
+"""
+Constant-cost scrolling waveform view for live recording.
+
+ScrollingWaveformPlot shows the last `window` seconds as a fixed number of
+min/max bins, drawn as one filled polygon (much cheaper to rasterize than a
+zig-zag line). Only frames captured since the previous frame are reduced, the
+artists are updated in place and the axes are redrawn with matplotlib
+blitting, so each refresh costs the same after ten seconds or ten hours.
+The refresh interval adapts to how long drawing actually takes. Pop markers
+are snapped to the bins, so there are never more than n_bins of them. A
+multichannel capture is drawn as one envelope spanning all channels.
+"""
+import bisect
+import time
+
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+
+DEFAULT_WINDOW = 30.0  # seconds shown
+DEFAULT_BINS = 1500  # min/max pairs drawn
+MIN_INTERVAL = 0.03  # seconds between refreshes at best (~30 fps)
+MAX_INTERVAL = 1.0
+DRAW_BUDGET = 0.2  # fraction of the Tk thread drawing may take
+
+
+class ScrollingWaveformPlot:
+    def __init__(self, ax, canvas, sr, window=DEFAULT_WINDOW, n_bins=DEFAULT_BINS):
+        self.ax = ax
+        self.canvas = canvas
+        self.sr = sr
+        self.bin_frames = max(1, int(window * sr) // n_bins)
+        self.n_bins = n_bins
+        self.window = self.bin_frames * n_bins / sr
+
+        self.mins = np.zeros(n_bins, dtype=np.float32)
+        self.maxs = np.zeros(n_bins, dtype=np.float32)
+        self.position = 0  # first frame not yet reduced into a bin
+        self.interval = MIN_INTERVAL
+        self.background = None
+
+        # x is "seconds before now" and never changes, so the axes can be blitted
+        bin_times = (np.arange(n_bins) - n_bins + 1) * self.bin_frames / sr
+        # Polygon outline: along the maxima forwards, back along the minima
+        self.verts = np.empty((2 * n_bins, 2))
+        self.verts[:n_bins, 0] = bin_times
+        self.verts[n_bins:, 0] = bin_times[::-1]
+
+        self.ax.clear()
+        self.ax.set_xlim(-self.window, 0)
+        self.ax.set_ylim(-1, 1)
+        self.ax.set_xlabel('Time relative to now (s)')
+        self.ax.set_ylabel('Amplitude')
+        self.ax.set_title('Live Audio Amplitude')
+        self.envelope = PolyCollection([], animated=True, label='Live Audio Waveform')
+        self.ax.add_collection(self.envelope)
+        self.markers = LineCollection([], colors='r', linestyles='--', animated=True, label='Pop Detected')
+        self.ax.add_collection(self.markers)
+        self.ax.legend(loc='upper left')
+
+        # Recapture the static background after every full draw (e.g. on resize)
+        self.draw_cid = self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.draw()
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        self.ax.draw_artist(self.envelope)
+        self.ax.draw_artist(self.markers)
+
+    def _consume(self, capture):
+        # Reduce only the complete bins captured since the last refresh
+        end = capture.frames_written // self.bin_frames * self.bin_frames
+        start = max(self.position, end - self.n_bins * self.bin_frames, capture.first_frame)
+        start = -(-start // self.bin_frames) * self.bin_frames  # round up to a bin boundary
+        if end <= start:
+            return
+        # All channels of a bin reduce together: (frames, channels) rows are contiguous
+        new_bins = capture.read(start, end, channel=None).reshape(-1, self.bin_frames * capture.channels)
+        k = len(new_bins)
+        # Scroll the fixed-size bin arrays left by k and append the new bins
+        self.mins[:-k] = self.mins[k:]
+        self.maxs[:-k] = self.maxs[k:]
+        self.mins[-k:] = new_bins.min(axis=1)
+        self.maxs[-k:] = new_bins.max(axis=1)
+        self.position = end
+
+    def update(self, capture, pop_onsets=()):
+        """
+        Refresh the view from a capture_buffer.CaptureBuffer and a sequence of
+        pop onset times in seconds, sorted ascending (only the visible tail is
+        touched). Returns the delay in seconds until the next refresh.
+        """
+        draw_start = time.perf_counter()
+        self._consume(capture)
+        self.verts[:self.n_bins, 1] = self.maxs
+        self.verts[self.n_bins:, 1] = self.mins[::-1]
+        self.envelope.set_verts([self.verts])
+
+        now = self.position / self.sr
+        first_visible = bisect.bisect_left(pop_onsets, now - self.window)
+        # At most one marker per bin, so a burst of pops cannot slow the refresh down
+        bin_seconds = self.bin_frames / self.sr
+        visible = np.unique(np.round((np.asarray(pop_onsets[first_visible:]) - now) / bin_seconds)) * bin_seconds
+        segments = np.empty((len(visible), 2, 2))
+        segments[:, :, 0] = visible[:, None]
+        segments[:, :, 1] = (-1, 1)
+        self.markers.set_segments(segments)
+
+        if self.background is not None:
+            self.canvas.restore_region(self.background)
+            self._draw_artists()
+            self.canvas.blit(self.ax.bbox)
+
+        # Slow down when drawing is expensive, speed back up when it is cheap
+        draw_time = time.perf_counter() - draw_start
+        self.interval = min(MAX_INTERVAL, max(MIN_INTERVAL, draw_time / DRAW_BUDGET))
+        return self.interval
+
+    def close(self):
+        self.canvas.mpl_disconnect(self.draw_cid)
+        self.background = None
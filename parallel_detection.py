@@ -0,0 +1,158 @@
+"""
+Multi-core pop detection over an in-memory signal.
+
+The signal is split into a few contiguous ranges per core (enough to balance
+the load) and each range is scanned on a thread in sub-blocks sized to the
+per-core cache, reusing the same scratch buffers. The work is done by NumPy
+ufuncs, which release the GIL, and the signal itself is shared read-only, so
+threads scale without copying it into processes. Range results are merged
+in order, so runs that straddle a range boundary are joined exactly as in
+pop_detection.detect_pops.
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+
+import instrumentation
+import pop_detection
+
+DEFAULT_CACHE_BYTES = 1024 * 1024
+TASKS_PER_WORKER = 4  # more ranges than threads so a slow range does not hold up the rest
+MIN_TASK_SAMPLES = 1 << 16  # below this, task overhead outweighs the work
+
+_executor = None
+
+
+def worker_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cache_bytes():
+    """
+    Size of the per-core (L2) cache, or DEFAULT_CACHE_BYTES if unknown.
+    """
+    try:
+        with open("/sys/devices/system/cpu/cpu0/cache/index2/size") as f:
+            size = f.read().strip()
+        units = {"K": 1024, "M": 1024 ** 2}
+        return int(size[:-1]) * units[size[-1]] if size[-1] in units else int(size)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        size = os.sysconf("SC_LEVEL2_CACHE_SIZE")
+        if size > 0:
+            return size
+    except (ValueError, OSError, AttributeError):
+        pass
+    return DEFAULT_CACHE_BYTES
+
+
+def plan_chunks(n_samples, workers=None, itemsize=4):
+    """
+    Return (task_size, block_size): samples per task and per cache-sized
+    sub-block within a task.
+    """
+    workers = workers or worker_count()
+    # The kernel touches the input, |y| and the mask: keep them in cache together
+    block_size = max(1024, cache_bytes() // (2 * itemsize + 1))
+    task_size = max(MIN_TASK_SAMPLES, -(-n_samples // (workers * TASKS_PER_WORKER)))
+    task_size = -(-task_size // block_size) * block_size  # whole sub-blocks only
+    return task_size, block_size
+
+
+def _find_runs_in_range(y, start, stop, threshold, merge_gap_samples, block_size):
+    # Runs on a worker thread; y is only read
+    scratch = np.empty(min(block_size, stop - start), dtype=y.dtype)
+    mask = np.empty(len(scratch), dtype=bool)
+    runs = []
+    for block_start in range(start, stop, block_size):
+        block = y[block_start:min(block_start + block_size, stop)]
+        n = len(block)
+        abs_block = np.abs(block, out=scratch[:n])
+        np.greater(abs_block, threshold, out=mask[:n])
+        pop_indices = np.flatnonzero(mask[:n])
+        if len(pop_indices):
+            runs.append(pop_detection.group_pop_indices(abs_block, pop_indices, merge_gap_samples, block_start))
+    return pop_detection.merge_pop_runs(runs, merge_gap_samples)
+
+
+def _find_spectral_runs_in_range(y, sr, start, stop, threshold, merge_gap_samples):
+    import spectral_detection
+
+    context = min(spectral_detection.CONTEXT, start)
+    return spectral_detection.find_transient_runs(y[start - context:stop], sr, threshold, merge_gap_samples,
+                                                  start - context, context)
+
+
+def get_executor():
+    # One shared pool, so repeated detections (e.g. slider drags) do not respawn threads
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="detect")
+    return _executor
+
+
+def find_pop_runs_parallel(y, sr, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap_samples=0,
+                           mode=pop_detection.DEFAULT_MODE, executor=None, on_progress=None, workers=None):
+    """
+    Parallel equivalent of pop_detection.find_pop_runs (or the spectral
+    runs). threshold must be a plain number captured by the caller.
+    on_progress(fraction) is called on the calling thread as ranges finish,
+    in order; if it raises (e.g. to cancel), pending ranges are cancelled and
+    the exception propagates. workers is the number of threads of a custom
+    executor (default: one per core).
+    """
+    executor = executor or get_executor()
+    if mode == "spectral":
+        import spectral_detection
+
+        # The same blocks as the in-memory detector, since the scores are normalized per block
+        ranges = spectral_detection.block_ranges(len(y), sr)
+        submit = lambda start, stop: executor.submit(_find_spectral_runs_in_range, y, sr, start, stop, threshold,
+                                                     merge_gap_samples)
+    else:
+        task_size, block_size = plan_chunks(len(y), workers, y.dtype.itemsize)
+        ranges = [(start, min(start + task_size, len(y))) for start in range(0, len(y), task_size)]
+        submit = lambda start, stop: executor.submit(_find_runs_in_range, y, start, stop, threshold,
+                                                     merge_gap_samples, block_size)
+
+    futures = [submit(start, stop) for start, stop in ranges]
+    runs = []
+    try:
+        # Collect in submission order so boundary runs merge correctly
+        for i, future in enumerate(futures):
+            runs.append(future.result())
+            if on_progress is not None:
+                on_progress((i + 1) / len(futures))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return pop_detection.merge_pop_runs(runs, merge_gap_samples)
+
+
+def detect_pops_parallel(y, sr, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap=pop_detection.DEFAULT_MERGE_GAP,
+                         mode=pop_detection.DEFAULT_MODE, executor=None, on_progress=None, workers=None):
+    """
+    Same events as pop_detection.detect_pops, computed on all cores. Each
+    channel of a (frames, channels) signal is scanned as a strided view.
+    """
+    merge_gap_samples = int(merge_gap * sr)
+    n_channels = 1 if y.ndim == 1 else y.shape[1]
+    events = []
+    with instrumentation.span("detect", mode=mode, samples=y.size, parallel=True) as fields:
+        for channel, channel_y in pop_detection.channel_views(y):
+            channel_progress = None
+            if on_progress is not None:
+                channel_progress = lambda fraction, channel=channel: on_progress((channel + fraction) / n_channels)
+            runs = find_pop_runs_parallel(channel_y, sr, threshold, merge_gap_samples, mode, executor,
+                                          channel_progress, workers)
+            events.extend(pop_detection.runs_to_events(runs, sr, channel))
+        fields["events"] = len(events)
+    instrumentation.count("samples_processed", y.size)
+    instrumentation.count("events_found", len(events))
+    return pop_detection.sort_events(events) if n_channels > 1 else events
@@ -0,0 +1,92 @@
+"""
+Zero-copy playback of an already-decoded signal.
+
+AudioPlayer plays straight from the float32 array used for detection: the
+sounddevice output callback copies each hardware block out of a slice of y,
+so nothing is re-encoded and no second decoded copy of the file is kept.
+Seeking only moves the read position, which makes it cheap to audition a
+short window around each detected pop.
+"""
+import threading
+
+DEFAULT_PRE_ROLL = 0.5  # seconds played before a pop
+DEFAULT_POST_ROLL = 1.0  # seconds played after a pop
+
+
+class AudioPlayer:
+    def __init__(self):
+        self.y = None
+        self.sr = None
+        self.stream = None
+        self._position = 0  # next sample to play
+        self._stop_at = 0  # playback ends before this sample
+        self._lock = threading.Lock()
+
+    def set_audio(self, y, sr):
+        """
+        Use y (mono or frames x channels) at rate sr for playback; y is not copied.
+        """
+        self.stop()
+        self.y = y
+        self.sr = sr
+
+    @property
+    def is_playing(self):
+        return self.stream is not None and self.stream.active
+
+    @property
+    def position(self):
+        # Current playback position in seconds
+        return self._position / self.sr if self.sr else 0.0
+
+    def play(self, start=0.0, stop=None):
+        """
+        Play from start to stop seconds (default: to the end).
+        """
+        import sounddevice as sd
+
+        if self.y is None:
+            return
+        self.stop()
+        with self._lock:
+            self._position = min(len(self.y), max(0, int(start * self.sr)))
+            self._stop_at = len(self.y) if stop is None else min(len(self.y), max(0, int(stop * self.sr)))
+        channels = 1 if self.y.ndim == 1 else self.y.shape[1]
+        self.stream = sd.OutputStream(samplerate=self.sr, channels=channels, dtype="float32",
+                                      callback=self._callback)
+        self.stream.start()
+
+    def play_window(self, onset, pre_roll=DEFAULT_PRE_ROLL, post_roll=DEFAULT_POST_ROLL):
+        """
+        Audition a pop: play from pre_roll seconds before onset to post_roll after it.
+        """
+        self.play(max(0.0, onset - pre_roll), onset + post_roll)
+
+    def seek(self, seconds):
+        # Takes effect from the next hardware block
+        with self._lock:
+            self._position = min(len(self.y), max(0, int(seconds * self.sr)))
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def _callback(self, outdata, frames, time, status):
+        # Runs on the audio thread: copy the next slice of y, never allocate
+        import sounddevice as sd
+
+        with self._lock:
+            start = self._position
+            stop = min(start + frames, self._stop_at)
+            self._position = max(start, stop)
+        n = max(0, stop - start)
+        chunk = self.y[start:start + n]
+        if chunk.ndim == 1:
+            outdata[:n, 0] = chunk
+        else:
+            outdata[:n] = chunk
+        if n < frames:
+            outdata[n:] = 0
+            raise sd.CallbackStop()
@@ -0,0 +1,275 @@
+"""
+Headless pop sound detection engine.
+
+This module has no GUI dependencies (no Tk, matplotlib or pygame) so it can be
+used from batch jobs, worker processes and servers as well as from the
+AudioPopDetector front-ends.
+"""
+import collections
+
+import numpy as np
+
+import instrumentation
+from resampling import DEFAULT_DECIMATION
+
+DEFAULT_THRESHOLD = 0.4
+DEFAULT_MERGE_GAP = 0.5  # Above-threshold samples closer than this (seconds) belong to the same pop
+
+# "amplitude" gates the absolute sample value; "spectral" gates a 0..1
+# transient score (spectral flux, high-frequency ratio, crest factor), see
+# spectral_detection.py
+DETECTION_MODES = ("amplitude", "spectral")
+DEFAULT_MODE = "amplitude"
+
+# A single detected pop. onset/offset/duration are in seconds (offset is
+# exclusive), peak is the loudest absolute amplitude within the pop and
+# channel is the index of the channel it was found on.
+PopEvent = collections.namedtuple("PopEvent", ["onset", "offset", "peak", "duration", "channel"], defaults=(0,))
+
+# Multichannel signals are (frames, channels) arrays throughout, like
+# soundfile and capture_buffer.CaptureBuffer; a 1-D array is a single channel.
+
+
+def load_audio(file_path, sr=None, cache=None, mono=True, decimation=DEFAULT_DECIMATION):
+    """
+    Decode an audio file to a float32 array: mono (a downmix) by default,
+    or (frames, channels) with mono=False. With sr, the rate is reduced with
+    the given resampling.DECIMATION_MODES mode (which decides the returned
+    rate; see resampling.py).
+    Returns (y, sr). librosa is only imported when a file is actually loaded.
+    If an audio_cache.AudioCache is given, y may be a read-only memory map.
+    """
+    with instrumentation.span("load", file=file_path, cached=cache is not None):
+        if cache is not None:
+            return cache.load(file_path, sr=sr, mono=mono, decimation=decimation)
+        return decode_audio(file_path, sr, mono, decimation)
+
+
+def decode_audio(file_path, sr=None, mono=True, decimation=DEFAULT_DECIMATION):
+    """
+    Decode with librosa, like load_audio without a cache. The file is
+    decoded at its native rate and reduced separately (the default soxr_hq
+    is exactly what librosa.load does), so the two costs are timed as
+    separate stages.
+    """
+    import librosa
+    import resampling
+
+    with instrumentation.span("decode", file=file_path):
+        y, native_sr = librosa.load(file_path, sr=None, mono=mono)
+    instrumentation.count("bytes_decoded", y.nbytes)
+    if y.ndim == 2:
+        y = y.T  # librosa returns (channels, frames); the transpose is a view
+    if sr is None or sr == native_sr:
+        return y, native_sr
+    with instrumentation.span("resample", file=file_path, orig_sr=native_sr, target_sr=sr, decimation=decimation):
+        return resampling.decimate(y, native_sr, sr, decimation)
+
+
+def channel_views(y):
+    """
+    Yield (channel, 1-D view) for every channel of y without copying.
+    """
+    if y.ndim == 1:
+        yield 0, y
+    else:
+        for channel in range(y.shape[1]):
+            yield channel, y[:, channel]
+
+
+def sort_events(events):
+    # Events of all channels in time order (ties by channel)
+    return sorted(events, key=lambda event: (event.onset, event.channel))
+
+
+def find_pop_runs(y, threshold=DEFAULT_THRESHOLD, merge_gap_samples=0, start_idx=0):
+    """
+    Vectorized run-length extraction of above-threshold regions.
+    Runs separated by at most merge_gap_samples quiet samples are merged.
+    Returns (onsets, offsets, peaks) as arrays of absolute sample indices
+    (offsets exclusive) and peak absolute amplitudes.
+    """
+    abs_y = np.abs(y)
+    return group_pop_indices(abs_y, np.flatnonzero(abs_y > threshold), merge_gap_samples, start_idx)
+
+
+def group_pop_indices(abs_y, pop_indices, merge_gap_samples=0, start_idx=0):
+    """
+    Group sorted above-threshold sample indices of abs_y into runs.
+    Returns (onsets, offsets, peaks) like find_pop_runs.
+    """
+    if len(pop_indices) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=abs_y.dtype)
+
+    # A new run starts wherever the gap to the previous loud sample is too long
+    breaks = np.flatnonzero(np.diff(pop_indices) > merge_gap_samples + 1)
+    run_starts = np.concatenate(([0], breaks + 1))
+    run_ends = np.concatenate((breaks, [len(pop_indices) - 1]))
+
+    onsets = pop_indices[run_starts] + start_idx
+    offsets = pop_indices[run_ends] + 1 + start_idx
+    peaks = np.maximum.reduceat(abs_y[pop_indices], run_starts)
+    return onsets, offsets, peaks
+
+
+def merge_pop_runs(runs, merge_gap_samples=0):
+    """
+    Concatenate (onsets, offsets, peaks) runs from consecutive, ordered chunks
+    and merge runs that straddle a chunk boundary.
+    """
+    runs = [run for run in runs if len(run[0])]
+    if not runs:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    onsets = np.concatenate([run[0] for run in runs])
+    offsets = np.concatenate([run[1] for run in runs])
+    peaks = np.concatenate([run[2] for run in runs])
+
+    # Same rule as find_pop_runs: a run continues the previous one when the
+    # quiet gap between them is no longer than merge_gap_samples
+    new_run = np.concatenate(([True], onsets[1:] - offsets[:-1] > merge_gap_samples))
+    run_starts = np.flatnonzero(new_run)
+    run_ends = np.concatenate((run_starts[1:], [len(onsets)])) - 1
+    return onsets[run_starts], offsets[run_ends], np.maximum.reduceat(peaks, run_starts)
+
+
+def runs_to_events(runs, sr, channel=0):
+    """
+    Convert (onsets, offsets, peaks) sample runs to a list of PopEvent.
+    """
+    onsets, offsets, peaks = runs
+    return [
+        PopEvent(onset=onset / sr, offset=offset / sr, peak=peak, duration=(offset - onset) / sr, channel=channel)
+        for onset, offset, peak in zip(onsets.tolist(), offsets.tolist(), peaks.tolist())
+    ]
+
+
+def detect_pops(y, sr, threshold=DEFAULT_THRESHOLD, merge_gap=DEFAULT_MERGE_GAP, mode=DEFAULT_MODE):
+    """
+    Detect pop sounds in a signal using an amplitude threshold, or a
+    transient-score threshold when mode is "spectral". A (frames, channels)
+    signal is analyzed channel by channel.
+    Returns a list of PopEvent sorted by onset.
+    """
+    events = []
+    with instrumentation.span("detect", mode=mode, samples=y.size) as fields:
+        for channel, channel_y in channel_views(y):
+            if mode == "spectral":
+                import spectral_detection
+
+                channel_events = spectral_detection.detect_pops_spectral(channel_y, sr, threshold, merge_gap)
+                events.extend(event._replace(channel=channel) for event in channel_events)
+            else:
+                events.extend(runs_to_events(find_pop_runs(channel_y, threshold, int(merge_gap * sr)), sr, channel))
+        fields["events"] = len(events)
+    instrumentation.count("samples_processed", y.size)
+    instrumentation.count("events_found", len(events))
+    return sort_events(events) if y.ndim == 2 else events
+
+
+def detect_pops_in_file(file_path, threshold=DEFAULT_THRESHOLD, sr=None, merge_gap=DEFAULT_MERGE_GAP, cache=None,
+                        mode=DEFAULT_MODE, mono=True, decimation=DEFAULT_DECIMATION):
+    """
+    Load an audio file and detect pop sounds in it (in every channel with
+    mono=False).
+    Returns (events, y, sr) so callers can reuse the decoded signal.
+    """
+    y, sr = load_audio(file_path, sr=sr, cache=cache, mono=mono, decimation=decimation)
+    return detect_pops(y, sr, threshold, merge_gap, mode), y, sr
+
+
+def find_block_runs(block, sr, threshold=DEFAULT_THRESHOLD, merge_gap_samples=0, mode=DEFAULT_MODE, channel=None):
+    """
+    Runs in the new (non-overlapping) samples of an audio_stream.AudioBlock
+    (of one channel of a multichannel block if channel is given).
+    The spectral mode also uses the overlap as analysis context.
+    """
+    data = block.data if channel is None else block.data[:, channel]
+    if mode == "spectral":
+        import spectral_detection
+
+        return spectral_detection.find_transient_runs(data, sr, threshold, merge_gap_samples, block.start,
+                                                      block.overlap)
+    return find_pop_runs(data[block.overlap:], threshold, merge_gap_samples, block.start + block.overlap)
+
+
+def detect_pops_in_stream(blocks, sr, threshold=DEFAULT_THRESHOLD, merge_gap=DEFAULT_MERGE_GAP, mode=DEFAULT_MODE):
+    """
+    Detect pop sounds in an iterable of audio_stream.AudioBlock; blocks of
+    shape (frames, channels) are analyzed per channel over strided views.
+    Only the new (non-overlapping) samples of each block are scanned, so
+    memory use is bounded by the block size rather than the signal length.
+    """
+    merge_gap_samples = int(merge_gap * sr)
+    if mode == "spectral":
+        import spectral_detection
+
+        # A short last block is too short to normalize its scores against
+        blocks = spectral_detection.fold_short_tail(blocks, sr)
+    runs = {}  # channel -> completed runs
+    pending = {}  # channel -> last run, which may still continue into the next block
+    samples = 0
+    # Decoding happens as the blocks are pulled, so this stage includes it
+    with instrumentation.span("stream_detect", mode=mode) as fields:
+        for block in blocks:
+            new_data = block.data[block.overlap:]
+            samples += new_data.size
+            instrumentation.count("bytes_decoded", new_data.nbytes)
+            channels = [None] if block.data.ndim == 1 else range(block.data.shape[1])
+            for channel in channels:
+                block_runs = find_block_runs(block, sr, threshold, merge_gap_samples, mode, channel)
+                if len(block_runs[0]) == 0:
+                    continue
+                previous = pending.get(channel)
+                merged = merge_pop_runs([previous, block_runs] if previous else [block_runs], merge_gap_samples)
+                runs.setdefault(channel, []).append(tuple(column[:-1] for column in merged))
+                pending[channel] = tuple(column[-1:] for column in merged)
+
+        events = []
+        for channel in pending:  # every channel with runs has a pending run
+            channel_runs = runs[channel] + [pending[channel]]
+            events.extend(runs_to_events(merge_pop_runs(channel_runs, merge_gap_samples), sr, channel or 0))
+        fields.update(samples=samples, events=len(events))
+    instrumentation.count("samples_processed", samples)
+    instrumentation.count("events_found", len(events))
+    return sort_events(events)
+
+
+def open_detection_stream(file_path, sr=None, block_duration=None, mode=DEFAULT_MODE, start=0, mono=True,
+                          decimation=DEFAULT_DECIMATION):
+    """
+    Open an audio_stream.AudioStream set up for detect_pops_in_stream in
+    the given mode (the spectral mode needs overlap between blocks).
+    """
+    import audio_stream
+
+    if block_duration is None:
+        if mode == "spectral":
+            import spectral_detection
+
+            # The spectral scores depend on the block length, so use the in-memory detector's blocks
+            block_duration = spectral_detection.DEFAULT_BLOCK_DURATION
+        else:
+            block_duration = audio_stream.DEFAULT_BLOCK_DURATION
+    stream = audio_stream.AudioStream(file_path, sr=sr, block_duration=block_duration, start=start, mono=mono,
+                                      decimation=decimation)
+    if mode == "spectral":
+        import spectral_detection
+
+        # Each block needs one FFT frame of context from the previous one
+        stream.overlap = spectral_detection.CONTEXT
+    return stream
+
+
+def detect_pops_in_file_streaming(file_path, threshold=DEFAULT_THRESHOLD, sr=None, merge_gap=DEFAULT_MERGE_GAP,
+                                  block_duration=None, mode=DEFAULT_MODE, start=0, mono=True,
+                                  decimation=DEFAULT_DECIMATION):
+    """
+    Detect pop sounds in a file without ever decoding it fully into memory,
+    optionally from native frame `start` on (event times stay absolute).
+    Returns (events, sr).
+    """
+    stream = open_detection_stream(file_path, sr, block_duration, mode, start, mono, decimation)
+    return detect_pops_in_stream(stream, stream.sr, threshold, merge_gap, mode), stream.sr
@@ -0,0 +1,141 @@
+"""
+Selectable sample-rate reduction before detection.
+
+Detecting at a lower rate shrinks everything downstream (detection, the
+spectral detector's STFT, the plot envelope and threshold index, memory),
+but how the rate is reduced decides whether short clicks survive it. The
+modes, with the time to reduce 10 minutes of 44.1 kHz stereo to 11025 Hz on
+one core (amplitude detection over the native samples takes about 0.12 s):
+
+    none        No reduction; every native sample is scanned. Exact events.
+    soxr_hq     librosa's default band-limited resampler (soxr HQ), 0.27 s.
+                Right for listening and for the spectral detector, but it
+                low-passes at the new Nyquist frequency, which smears and
+                attenuates clicks: in a synthetic test the mean pop peak
+                dropped from 0.74 to 0.64 and quiet pops fall below the
+                threshold.
+    polyphase   scipy.signal.resample_poly (windowed-sinc polyphase FIR),
+                1.7 s. The same band-limiting and effect on clicks; slower
+                than soxr here, and in-memory only (not for streaming).
+    stride      Keep every k-th sample (k = native rate // target rate) as a
+                view: no filtering and no copy, effectively free. Aliases,
+                and a click shorter than k samples can be missed entirely.
+    block_peak  Replace each block of k samples by its sample of largest
+                magnitude, 0.7 s. Not a resampler (it sounds harsh and
+                aliases), but every block keeps its peak, so the amplitude
+                detector finds the same pops with the same peaks as at the
+                native rate, onsets rounded to k samples. Use it to shrink
+                long recordings for amplitude detection; not for the
+                spectral detector.
+
+stride and block_peak reduce by a whole factor, so the resulting rate is
+native / k, at least the requested rate (e.g. 12000 Hz for 48 kHz to 11025 Hz).
+"""
+import math
+
+import numpy as np
+
+DECIMATION_MODES = ("none", "soxr_hq", "polyphase", "stride", "block_peak")
+DEFAULT_DECIMATION = "soxr_hq"  # what librosa.load(sr=...) does
+# Modes StreamDecimator can apply block by block
+STREAMING_MODES = ("none", "soxr_hq", "stride", "block_peak")
+
+
+def integer_factor(native_sr, target_sr):
+    return max(1, int(native_sr // target_sr))
+
+
+def output_rate(native_sr, target_sr, mode=DEFAULT_DECIMATION):
+    """
+    Sample rate the given mode produces for a requested target_sr (an int
+    where exact, else a float).
+    """
+    if target_sr is None or mode == "none" or target_sr == native_sr:
+        return native_sr
+    if mode in ("stride", "block_peak"):
+        factor = integer_factor(native_sr, target_sr)
+        return native_sr // factor if native_sr % factor == 0 else native_sr / factor
+    return target_sr
+
+
+def block_peaks(y, factor):
+    """
+    The signed sample of largest magnitude in every block of factor frames
+    of y (1-D or (frames, channels)); a partial last block is dropped.
+    """
+    n_blocks = len(y) // factor
+    blocks = np.asarray(y[:n_blocks * factor]).reshape((n_blocks, factor) + y.shape[1:])
+    loudest = np.abs(blocks).argmax(axis=1)
+    return np.take_along_axis(blocks, loudest[:, None], axis=1)[:, 0]
+
+
+def decimate(y, native_sr, target_sr, mode=DEFAULT_DECIMATION):
+    """
+    Reduce y (1-D or (frames, channels)) from native_sr towards target_sr
+    with one of DECIMATION_MODES. Returns (y, sr).
+    """
+    if mode not in DECIMATION_MODES:
+        raise ValueError(f"Unknown decimation mode {mode!r}; expected one of {', '.join(DECIMATION_MODES)}")
+    sr = output_rate(native_sr, target_sr, mode)
+    if sr == native_sr:
+        return y, native_sr
+
+    if mode == "soxr_hq":
+        import soxr
+
+        return soxr.resample(y, native_sr, target_sr, quality="HQ"), sr
+    if mode == "polyphase":
+        from scipy.signal import resample_poly
+
+        g = math.gcd(int(native_sr), int(target_sr))
+        out = resample_poly(y, int(target_sr) // g, int(native_sr) // g, axis=0)
+        return out.astype(np.float32, copy=False), sr
+
+    factor = integer_factor(native_sr, target_sr)
+    if mode == "stride":
+        return y[::factor], sr
+    return block_peaks(y, factor), sr
+
+
+class StreamDecimator:
+    """
+    Apply a streaming-capable decimation mode to consecutive pieces of a
+    signal; the output equals decimate() on the whole signal (for soxr_hq,
+    that of soxr's streaming resampler).
+    """
+    def __init__(self, native_sr, target_sr, mode=DEFAULT_DECIMATION, channels=None):
+        if mode not in STREAMING_MODES:
+            raise ValueError(f"Decimation mode {mode!r} needs the whole signal; use one of "
+                             f"{', '.join(STREAMING_MODES)} for streaming")
+        self.mode = mode
+        self.sr = output_rate(native_sr, target_sr, mode)
+        self.factor = integer_factor(native_sr, target_sr) if self.sr != native_sr else 1
+        self.frame_shape = () if channels is None else (channels,)
+        self.phase = 0  # stride: index in the next piece of the next kept sample
+        self.remainder = None  # block_peak: frames of an unfinished block
+        self.resampler = None
+        if self.sr != native_sr and mode == "soxr_hq":
+            import soxr
+
+            self.resampler = soxr.ResampleStream(native_sr, target_sr, channels or 1, dtype="float32")
+
+    def process(self, piece):
+        if self.factor == 1 and self.resampler is None:
+            return piece
+        if self.resampler is not None:
+            return self.resampler.resample_chunk(piece)
+        if self.mode == "stride":
+            out = piece[self.phase::self.factor]
+            self.phase = (self.phase - len(piece)) % self.factor
+            return out
+        if self.remainder is not None and len(self.remainder):
+            piece = np.concatenate((self.remainder, piece))
+        n_full = len(piece) // self.factor * self.factor
+        self.remainder = piece[n_full:].copy()
+        return block_peaks(piece[:n_full], self.factor)
+
+    def flush(self):
+        # Whatever the resampler still holds; an unfinished block_peak block is dropped like in decimate()
+        if self.resampler is not None:
+            return self.resampler.resample_chunk(np.zeros((0,) + self.frame_shape, dtype=np.float32), last=True)
+        return np.zeros((0,) + self.frame_shape, dtype=np.float32)
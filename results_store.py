@@ -0,0 +1,168 @@
+"""
+Persistent store of detection results for incremental re-analysis.
+
+For every analyzed file and set of detector parameters (threshold, merge gap,
+sample rate, decimation, mode, channel handling) the store keeps the file's
+size, mtime, content fingerprint and the detected events, so a re-run can:
+
+    skip      files whose size and mtime (or, failing that, SHA-256) match
+    append    files that only grew, by decoding from the previous end frame
+    analyze   everything else from scratch
+
+Whether a file only grew is decided on the decoded audio rather than the raw
+bytes, because recorders rewrite the WAV header as they append. A signature
+of the first and last SIGNATURE_FRAMES frames of the previously analyzed
+audio must still match. Appending needs a seekable (libsndfile) format,
+native-rate analysis and the amplitude detector (spectral scores are
+normalized per block, so resuming mid-file would change earlier results);
+otherwise a changed file is analyzed in full.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from audio_cache import file_hash
+from resampling import DEFAULT_DECIMATION
+
+DEFAULT_STORE_PATH = "pop_results.sqlite"
+SIGNATURE_FRAMES = 4096
+APPEND_MODES = ("amplitude",)  # detection modes whose results can be extended
+
+
+def params_key(threshold, merge_gap, sr, mode, mono=True, decimation=DEFAULT_DECIMATION):
+    """
+    Canonical string for a set of detector parameters.
+    """
+    params = {"threshold": threshold, "merge_gap": merge_gap, "sr": sr, "mode": mode}
+    # Non-default options only, which keeps the keys of existing results unchanged
+    if not mono:
+        params["mono"] = False
+    if sr is not None and decimation != DEFAULT_DECIMATION:
+        params["decimation"] = decimation
+    return json.dumps(params, sort_keys=True)
+
+
+def native_frames(file_path):
+    """
+    Number of frames in the file from its header, or None if libsndfile
+    cannot read it.
+    """
+    import soundfile as sf
+
+    try:
+        return sf.info(file_path).frames
+    except (sf.LibsndfileError, RuntimeError):
+        return None
+
+
+def content_signature(file_path, frames):
+    """
+    Hash of the first and last SIGNATURE_FRAMES decoded frames of the first
+    `frames` frames of the file, or None if it cannot be read with libsndfile.
+    """
+    import soundfile as sf
+
+    digest = hashlib.sha256()
+    try:
+        head = sf.read(file_path, frames=min(frames, SIGNATURE_FRAMES), dtype="float32", always_2d=True)[0]
+        tail = sf.read(file_path, start=max(0, frames - SIGNATURE_FRAMES), stop=frames, dtype="float32",
+                       always_2d=True)[0]
+    except (sf.LibsndfileError, RuntimeError):
+        return None
+    if len(tail) == 0 or max(0, frames - SIGNATURE_FRAMES) + len(tail) != frames:
+        return None  # the file is shorter than it used to be
+    digest.update(np.ascontiguousarray(head).tobytes())
+    digest.update(np.ascontiguousarray(tail).tobytes())
+    return digest.hexdigest()
+
+
+def plan_update(file_path, previous, mode="amplitude"):
+    """
+    Decide how to bring a stored result up to date; runs in the worker.
+    Returns (action, fingerprint) where action is "skip", "append" or
+    "analyze" and fingerprint is the file's SHA-256 if it had to be computed.
+    """
+    st = os.stat(file_path)
+    if previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        return "skip", previous["fingerprint"]
+    if mode in APPEND_MODES and st.st_size > previous["size"] and previous["frames"] and previous["signature"]:
+        # Grown: only the new audio needs decoding if the old audio is intact
+        if content_signature(file_path, previous["frames"]) == previous["signature"]:
+            return "append", None
+    if st.st_size == previous["size"] and previous["fingerprint"]:
+        # Touched but maybe not modified
+        fingerprint = file_hash(file_path)
+        if fingerprint == previous["fingerprint"]:
+            return "skip", fingerprint
+        return "analyze", fingerprint
+    return "analyze", None
+
+
+def resume_point(events, frames, sr, merge_gap):
+    """
+    Where to continue detection in a grown file. A channel's last event
+    ending within merge_gap of the resume point may still extend past it, so
+    the resume point moves back to its onset and it is detected again; that
+    can in turn reach another channel's last event, so this repeats until no
+    kept event is affected. Returns (start_frame, kept_events).
+    """
+    merge_gap_samples = int(merge_gap * sr)
+    start = frames
+    while True:
+        kept = [event for event in events if int(round(event["onset"] * sr)) < start]
+        last = {}
+        for event in kept:
+            last[event.get("channel", 0)] = event
+        reaching = [int(round(event["onset"] * sr)) for event in last.values()
+                    if event["offset"] * sr >= start - merge_gap_samples]
+        if not reaching:
+            return start, kept
+        start = min(reaching)
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "path TEXT, params TEXT, size INTEGER, mtime_ns INTEGER, fingerprint TEXT, "
+            "frames INTEGER, signature TEXT, sample_rate INTEGER, events TEXT, analyzed_at REAL, "
+            "PRIMARY KEY (path, params))")
+        self.connection.commit()
+
+    def get(self, file_path, params):
+        """
+        Stored row for file_path and a params_key as a dict (events decoded),
+        or None.
+        """
+        row = self.connection.execute("SELECT * FROM results WHERE path = ? AND params = ?",
+                                      (os.path.abspath(file_path), params)).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        row["events"] = json.loads(row["events"])
+        return row
+
+    def is_current(self, row, file_path):
+        # Cheap check in the main process: unchanged size and mtime
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        return row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns
+
+    def save(self, file_path, params, size, mtime_ns, fingerprint, frames, signature, sample_rate, events):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(file_path), params, size, mtime_ns, fingerprint, frames, signature, sample_rate,
+                 json.dumps(events), time.time()))
+
+    def close(self):
+        self.connection.close()
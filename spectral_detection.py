@@ -0,0 +1,157 @@
+"""
+Spectral/transient pop detection.
+
+Instead of gating raw amplitude, every short STFT frame is scored on three
+transient features:
+
+    spectral flux     how suddenly the (log) spectrum gains energy
+    high-freq ratio   share of the frame's energy above HF_CUTOFF Hz
+    crest factor      peak / RMS of the frame's samples
+
+Each feature is normalized against the median and MAD of its block (only
+rises above it count), so the detector adapts to the background: quiet
+clicks stand out in silence, and loud but steady music does not trigger it.
+The transient score is the mean normalized feature divided by SCORE_SCALE
+and clipped to [0, 1], so the same 0..1 threshold slider applies (0.4 is
+roughly four robust deviations).
+
+Frames are computed in large batches with librosa (one STFT call per block)
+over long blocks that overlap by one FFT frame, so events at block edges are
+seen with full context. Since the normalization is per block, every path
+uses the same blocks (block_ranges), so results do not depend on whether a
+file is analyzed in memory, in parallel or streamed.
+"""
+import numpy as np
+
+import pop_detection
+
+N_FFT = 512
+HOP_LENGTH = 128
+HF_CUTOFF = 4000.0  # Hz
+SCORE_SCALE = 10.0
+DEFAULT_BLOCK_DURATION = 60.0  # seconds per STFT batch
+MIN_BLOCK_DURATION = 10.0  # a shorter last block is folded into the previous one
+CONTEXT = N_FFT  # samples of overlap each block needs from the previous one
+
+
+def _robust_z(x):
+    # Only rises above the block's typical level count towards a transient
+    median = np.median(x)
+    mad = np.median(np.abs(x - median)) * 1.4826
+    return np.maximum(0.0, (x - median) / (mad + 1e-9))
+
+
+def transient_scores(y, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Return the transient score (0..1) of every frame of y, where frame i
+    covers y[i * hop_length:i * hop_length + n_fft].
+    """
+    import librosa
+
+    if len(y) < n_fft:
+        return np.zeros(0, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float32)
+
+    # One batched STFT for the whole block
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, center=False))
+    power = S ** 2
+
+    log_S = np.log1p(100.0 * S)
+    flux = np.concatenate(([0.0], np.maximum(0.0, np.diff(log_S, axis=1)).mean(axis=0)))
+
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    hf_ratio = power[freqs >= HF_CUTOFF].sum(axis=0) / (power.sum(axis=0) + 1e-12)
+
+    # Strided view of the same frames in the time domain (no copy)
+    frames = librosa.util.frame(y, frame_length=n_fft, hop_length=hop_length)
+    abs_frames = np.abs(frames)
+    rms = np.sqrt((frames ** 2).mean(axis=0))
+    crest = abs_frames.max(axis=0) / (rms + 1e-9)
+
+    n_frames = min(len(flux), len(hf_ratio), len(crest))
+    z = (_robust_z(flux[:n_frames]) + _robust_z(hf_ratio[:n_frames]) + _robust_z(crest[:n_frames])) / 3.0
+    return np.clip(z / SCORE_SCALE, 0.0, 1.0).astype(np.float32)
+
+
+def find_transient_runs(y, sr, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap_samples=0, start_idx=0,
+                        context=0, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Spectral counterpart of pop_detection.find_pop_runs. y[:context] is
+    overlap from the previous block and only provides analysis context.
+    Returns (onsets, offsets, peaks) in absolute samples, where peaks are
+    absolute amplitudes so events compare with the amplitude mode.
+    """
+    scores = transient_scores(y, sr, n_fft, hop_length)
+
+    # A frame belongs to this block if it ends inside the new samples
+    frame_ends = np.arange(len(scores)) * hop_length + n_fft
+    owned = frame_ends > context
+    first_frame = int(np.argmax(owned)) if owned.any() else len(scores)
+    scores = scores[first_frame:]
+
+    merge_gap_frames = merge_gap_samples // hop_length
+    frame_onsets, frame_offsets, _ = pop_detection.find_pop_runs(scores, threshold, merge_gap_frames, first_frame)
+    if len(frame_onsets) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    # Map frames to the hop-sized span around each frame's centre
+    centre_offset = n_fft // 2 - hop_length // 2
+    onsets = np.clip(frame_onsets * hop_length + centre_offset, 0, len(y))
+    offsets = np.clip(frame_offsets * hop_length + centre_offset, 0, len(y))
+    # The last frame also stands for the samples after its centre (e.g. a click near the end of the signal)
+    offsets[frame_offsets >= len(scores) + first_frame] = len(y)
+    abs_y = np.abs(y)
+    peaks = np.array([abs_y[onset:offset].max() if offset > onset else 0.0
+                      for onset, offset in zip(onsets.tolist(), offsets.tolist())], dtype=np.float32)
+    return onsets + start_idx, offsets + start_idx, peaks
+
+
+def block_ranges(n, sr, block_duration=DEFAULT_BLOCK_DURATION):
+    """
+    (start, stop) sample ranges of the analysis blocks of an n-sample
+    signal. The scores are normalized per block, so every path (in memory,
+    parallel, streaming) must use the same blocks: block_duration seconds
+    each, except that a last block shorter than MIN_BLOCK_DURATION (whose
+    few frames would be their own background) joins the one before.
+    """
+    block_size = max(CONTEXT + 1, int(block_duration * sr))
+    starts = list(range(0, n, block_size))
+    if len(starts) > 1 and n - starts[-1] < MIN_BLOCK_DURATION * sr:
+        starts.pop()
+    return list(zip(starts, starts[1:] + [n]))
+
+
+def fold_short_tail(blocks, sr):
+    """
+    Pass on an iterable of audio_stream.AudioBlock, joining a last block
+    with less than MIN_BLOCK_DURATION of new samples to the previous one,
+    like block_ranges does for a signal in memory.
+    """
+    previous = current = None
+    for block in blocks:
+        if previous is not None:
+            yield previous
+        previous, current = current, block
+    if previous is not None and current is not None and len(current.data) - current.overlap < MIN_BLOCK_DURATION * sr:
+        data = np.concatenate((previous.data, current.data[current.overlap:]))
+        yield previous._replace(data=data)
+        return
+    for block in (previous, current):
+        if block is not None:
+            yield block
+
+
+def detect_pops_spectral(y, sr, threshold=pop_detection.DEFAULT_THRESHOLD, merge_gap=pop_detection.DEFAULT_MERGE_GAP,
+                         block_duration=DEFAULT_BLOCK_DURATION):
+    """
+    Detect pops in a whole signal with the transient score, processing it in
+    overlapping blocks of block_duration seconds (see block_ranges).
+    """
+    merge_gap_samples = int(merge_gap * sr)
+    runs = []
+    for start, stop in block_ranges(len(y), sr, block_duration):
+        context = min(CONTEXT, start)
+        runs.append(find_transient_runs(y[start - context:stop], sr, threshold, merge_gap_samples,
+                                        start - context, context))
+    return pop_detection.runs_to_events(pop_detection.merge_pop_runs(runs, merge_gap_samples), sr)
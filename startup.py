@@ -0,0 +1,103 @@
+"""
+Startup helpers for the AudioPopDetector front-ends.
+
+The GUIs import only what they need to show the window; librosa, soundfile,
+mutagen and sounddevice are imported on first use. Once the window is up,
+prewarm() imports them on a background thread so the first load or playback
+does not pay the cost either.
+
+Running this module reports what each heavy import costs on its own (each is
+measured in a fresh interpreter) and, for any front-end scripts given, how
+long the script takes from launch until its window is shown:
+
+    python startup.py audio_analyzer2.0.py audio_analyzer_live.py
+"""
+import argparse
+import importlib
+import subprocess
+import sys
+import threading
+import time
+
+# Imported on first use by the front-ends, in rough order of need. librosa
+# loads its submodules lazily, so the submodule that does the work is named.
+PREWARM_MODULES = ["soundfile", "librosa.core.audio", "mutagen", "sounddevice"]
+REPORT_MODULES = ["numpy", "matplotlib.figure", "matplotlib.backends.backend_tkagg", "matplotlib.pyplot",
+                  "soundfile", "soxr", "scipy.signal", "librosa.core.audio", "librosa.onset", "mutagen", "sounddevice"]
+
+
+def prewarm(modules=PREWARM_MODULES):
+    """
+    Import modules on a daemon thread. Missing modules are skipped; the
+    error surfaces later where the module is actually used.
+    """
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_seconds(args):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + args, capture_output=True, text=True)
+    return time.perf_counter() - start, process
+
+
+def import_costs(modules=REPORT_MODULES, repeat=3):
+    """
+    Return [(module, seconds)] with the best cold import time of each module
+    in a fresh interpreter, minus the interpreter's own startup time
+    (seconds is None if the import fails).
+    """
+    baseline = min(_run_seconds(["-c", "pass"])[0] for _ in range(repeat))
+    costs = []
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            seconds, process = _run_seconds(["-c", f"import {module}"])
+            if process.returncode != 0:
+                break
+            times.append(seconds)
+        costs.append((module, max(0.0, min(times) - baseline) if times else None))
+    return costs
+
+
+def window_time(script, repeat=3):
+    """
+    Best time from launching script until its window is shown (the script
+    exits straight away when run with --startup-time).
+    """
+    best = None
+    for _ in range(repeat):
+        seconds, process = _run_seconds([script, "--startup-time"])
+        if process.returncode != 0:
+            print(f"{script} failed: {process.stderr.strip().splitlines()[-1:]}", file=sys.stderr)
+            return None
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report per-import and time-to-window startup costs.")
+    parser.add_argument("scripts", nargs="*", help="Front-end scripts to time until their window shows")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args(argv)
+
+    print("Import costs (fresh interpreter each):")
+    for module, seconds in import_costs(repeat=args.repeat):
+        print(f"  {module:40s} {'not installed' if seconds is None else f'{seconds * 1000:8.0f} ms'}")
+
+    for script in args.scripts:
+        seconds = window_time(script, args.repeat)
+        if seconds is not None:
+            print(f"{script}: window shown after {seconds * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+AudioCache hits, keys and eviction.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import pop_detection
+from audio_cache import AudioCache
+
+pytest.importorskip("librosa")
+sf = pytest.importorskip("soundfile")
+
+SR = 8000
+
+
+@pytest.fixture
+def counting_decoder(monkeypatch):
+    calls = []
+    decode_audio = pop_detection.decode_audio
+
+    def decode(*args, **kwargs):
+        calls.append(args)
+        return decode_audio(*args, **kwargs)
+
+    monkeypatch.setattr(pop_detection, "decode_audio", decode)
+    return calls
+
+
+def write_clip(path, seconds=1.0, seed=0):
+    y = np.random.default_rng(seed).uniform(-0.5, 0.5, (int(seconds * SR), 2)).astype(np.float32)
+    sf.write(path, y, SR, subtype="FLOAT")
+    return path
+
+
+def test_second_load_is_a_read_only_hit(tmp_path, counting_decoder):
+    file_path = write_clip(str(tmp_path / "clip.wav"))
+    cache = AudioCache(str(tmp_path / "cache"))
+    y, sr = cache.load(file_path)
+    cached, cached_sr = cache.load(file_path)
+    assert len(counting_decoder) == 1
+    assert (cached_sr, sr) == (SR, SR)
+    np.testing.assert_array_equal(cached, y)
+    with pytest.raises(ValueError):
+        cached[0] = 1.0
+
+
+def test_key_depends_on_content_and_options(tmp_path):
+    file_path = write_clip(str(tmp_path / "clip.wav"))
+    cache = AudioCache(str(tmp_path / "cache"))
+    keys = {cache.key(file_path), cache.key(file_path, sr=4000), cache.key(file_path, mono=False),
+            cache.key(file_path, sr=4000, decimation="block_peak")}
+    assert len(keys) == 4
+    write_clip(file_path, seed=1)
+    assert cache.key(file_path) not in keys
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, counting_decoder):
+    paths = [write_clip(str(tmp_path / f"clip{i}.wav"), seed=i) for i in range(3)]
+    entry_bytes = SR * 4 + 128  # a mono float32 .npy entry
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=2 * entry_bytes)
+    for path in paths[:2]:
+        cache.load(path)
+    # Make the first entry older, then touch it with a hit so the second is the oldest
+    for entry_path, _, _ in cache.entries():
+        os.utime(entry_path, (1, 1))
+    cache.load(paths[0])
+    cache.load(paths[2])
+    assert len(cache.entries()) == 2
+    assert len(counting_decoder) == 3
+    cache.load(paths[0])
+    assert len(counting_decoder) == 3
+    cache.load(paths[1])
+    assert len(counting_decoder) == 4
@@ -0,0 +1,60 @@
+"""
+Header-only metadata reading and the incremental metadata index.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import audio_metadata
+from audio_metadata import MetadataIndex
+
+sf = pytest.importorskip("soundfile")
+
+SR = 8000
+
+
+def write_clip(path, seconds=2.0, channels=2):
+    sf.write(path, np.zeros((int(seconds * SR), channels), dtype=np.float32), SR)
+    return path
+
+
+def test_parse_date_time():
+    assert audio_metadata.parse_date_time("2023-05-01") == "2023-05-01 00:00:00"
+    assert audio_metadata.parse_date_time("2023-05-01 12:30:00") == "2023-05-01 12:30:00"
+    assert audio_metadata.parse_date_time("May 2023") == "May 2023"
+
+
+def test_read_metadata_from_headers(tmp_path):
+    file_path = write_clip(str(tmp_path / "clip.wav"))
+    metadata = audio_metadata.read_metadata(file_path)
+    assert metadata["duration"] == pytest.approx(2.0)
+    assert metadata["sample_rate"] == SR
+    assert metadata["channels"] == 2
+    assert metadata["date"] is None
+
+
+def test_get_metadata_reports_errors_as_empty(tmp_path, capsys):
+    file_path = tmp_path / "broken.wav"
+    file_path.write_bytes(b"not audio")
+    assert audio_metadata.get_metadata(str(file_path)) == {}
+    assert "Error extracting metadata" in capsys.readouterr().out
+
+
+def test_index_rescans_only_changed_files(tmp_path):
+    paths = [write_clip(str(tmp_path / f"clip{i}.wav")) for i in range(3)]
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"not audio")
+    index = MetadataIndex(str(tmp_path / "index.sqlite"))
+    try:
+        assert index.scan(paths + [str(broken)]) == {"scanned": 4, "unchanged": 0, "removed": 0}
+        assert index.get(str(broken))["error"]
+        assert index.scan(paths + [str(broken)]) == {"scanned": 0, "unchanged": 4, "removed": 0}
+
+        write_clip(paths[0], seconds=3.0)
+        os.utime(paths[0], ns=(0, 1))  # changed even within the file system's timestamp resolution
+        assert index.scan(paths, prune=True) == {"scanned": 1, "unchanged": 2, "removed": 1}
+        assert index.get(os.path.relpath(paths[0]))["duration"] == pytest.approx(3.0)
+        assert [row["path"] for row in index.query("duration < ?", (2.5,))] == paths[1:]
+    finally:
+        index.close()
@@ -0,0 +1,61 @@
+"""
+Block-wise decoding with AudioStream and streaming detection.
+"""
+import numpy as np
+import pytest
+
+import pop_detection
+from audio_stream import AudioStream
+
+sf = pytest.importorskip("soundfile")
+
+SR = 8000
+
+
+@pytest.fixture
+def stereo_file(tmp_path):
+    rng = np.random.default_rng(0)
+    y = (rng.standard_normal((10 * SR + 123, 2)) * 0.02).astype(np.float32)
+    for position in rng.choice(len(y) - 10, 30, replace=False):
+        y[position:position + 5, int(rng.integers(0, 2))] = 0.9
+    file_path = str(tmp_path / "stereo.wav")
+    sf.write(file_path, y, SR, subtype="FLOAT")
+    return file_path, y
+
+
+@pytest.mark.parametrize("overlap_duration", [0.0, 0.25])
+def test_blocks_cover_the_file_once(stereo_file, overlap_duration):
+    file_path, y = stereo_file
+    stream = AudioStream(file_path, block_duration=1.0, overlap_duration=overlap_duration, mono=False)
+    blocks = list(stream)
+    assert all(len(block.data) - block.overlap == SR for block in blocks[:-1])
+    assert blocks[0].overlap == 0
+    for block in blocks:
+        np.testing.assert_array_equal(block.data, y[block.start:block.start + len(block.data)])
+    new_samples = np.concatenate([block.data[block.overlap:] for block in blocks])
+    np.testing.assert_array_equal(new_samples, y)
+    assert stream.frames_read == len(y)
+
+
+def test_mono_blocks_are_a_downmix(stereo_file):
+    file_path, y = stereo_file
+    data = np.concatenate([block.data for block in AudioStream(file_path, block_duration=1.0)])
+    np.testing.assert_allclose(data, y.mean(axis=1), atol=1e-6)
+
+
+def test_start_decodes_from_a_frame_offset(stereo_file):
+    file_path, y = stereo_file
+    blocks = list(AudioStream(file_path, block_duration=1.0, start=2 * SR + 5, mono=False))
+    assert blocks[0].start == 2 * SR + 5
+    np.testing.assert_array_equal(np.concatenate([block.data for block in blocks]), y[2 * SR + 5:])
+
+
+@pytest.mark.parametrize("mono", [True, False])
+def test_streaming_detection_matches_in_memory(stereo_file, mono):
+    file_path, y = stereo_file
+    if mono:
+        y = y.mean(axis=1)
+    stream = AudioStream(file_path, block_duration=1.0, mono=mono)
+    events = pop_detection.detect_pops_in_stream(stream, stream.sr, 0.4, 0.05)
+    assert len(events) > 0
+    assert events == pop_detection.detect_pops(y, SR, 0.4, 0.05)
@@ -0,0 +1,28 @@
+"""
+Per-file handling in batch_analyzer.analyze_file.
+"""
+import time
+
+import numpy as np
+import pytest
+
+import batch_analyzer
+import pop_detection
+
+
+def test_timeout_is_not_swallowed_by_except_exception(tmp_path, monkeypatch):
+    sf = pytest.importorskip("soundfile")
+    file_path = str(tmp_path / "clip.wav")
+    sf.write(file_path, np.zeros(8000, dtype=np.float32), 8000)
+
+    def slow_detection(*args, **kwargs):
+        try:
+            time.sleep(5)
+        except Exception:
+            pass  # e.g. a decoder that turns every error into "no audio"
+        return []
+
+    monkeypatch.setattr(pop_detection, "detect_pops_in_stream", slow_detection)
+    result = batch_analyzer.analyze_file(file_path, timeout=0.2)
+    assert result["status"] == "timeout"
+    assert result["elapsed"] < 2
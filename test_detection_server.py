@@ -0,0 +1,129 @@
+"""
+The detection server over HTTP and a Unix socket, with one worker process.
+"""
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+
+import detection_server
+
+SR = 8000
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = detection_server.DetectionService(workers=1, queue_size=0)
+    yield service
+    service.close()
+
+
+@pytest.fixture(scope="module")
+def server(service):
+    server = detection_server.DetectionHTTPServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read()), response
+    finally:
+        connection.close()
+
+
+def click_signal():
+    y = np.zeros(SR, dtype=np.float32)
+    y[1000:1010] = 0.9
+    y[7000] = -0.8
+    return y
+
+
+def test_health(server):
+    status, payload, _ = request(server, "GET", "/health")
+    assert status == 200
+    assert payload["status"] == "ok"
+    assert payload["workers"] == 1
+
+
+def test_detect_pcm(server):
+    status, payload, _ = request(server, "POST", f"/detect/pcm?sr={SR}&threshold=0.5", click_signal().tobytes())
+    assert status == 200
+    assert [round(event["onset"] * SR) for event in payload["events"]] == [1000, 7000]
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/detect", b"{not json"),
+    ("/detect", b"[]"),
+    ("/detect", b'{"path": "clip.wav", "sr": 0}'),
+    ("/detect", b'{"path": "clip.wav", "threshold": null}'),
+    ("/detect/pcm?sr=0", b""),
+    (f"/detect/pcm?sr={SR}&channels=0", b""),
+    (f"/detect/pcm?sr={SR}&mode=fft", b""),
+    ("/detect/pcm?channels=1", b""),
+])
+def test_bad_requests_get_400(server, path, body):
+    status, payload, _ = request(server, "POST", path, body)
+    assert status == 400
+    assert payload["status"] == "error"
+
+
+def test_negative_content_length_gets_400(server):
+    with socket.create_connection(server.server_address, timeout=10) as sock:
+        sock.sendall(b"POST /detect HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n")
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        assert response.status == 400
+
+
+def test_full_queue_gets_503(server, service):
+    # The only worker is busy and there is no queue
+    busy = service.submit(detection_server._ping, 1.0)
+    try:
+        status, payload, response = request(server, "POST", f"/detect/pcm?sr={SR}", click_signal().tobytes())
+        assert status == 503
+        assert response.getheader("Retry-After") == str(detection_server.RETRY_AFTER)
+    finally:
+        busy.result()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost", timeout=60)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_unix_socket(service):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "detector.sock")
+        server = detection_server.DetectionUnixServer(path, service)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            connection = UnixHTTPConnection(path)
+            connection.request("POST", f"/detect/pcm?sr={SR}&threshold=0.5", click_signal().tobytes())
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+    assert response.status == 200
+    assert len(payload["events"]) == 2
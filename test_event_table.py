@@ -0,0 +1,59 @@
+"""
+EventTable queries, file replacement and persistence.
+"""
+import os
+
+import numpy as np
+
+from event_table import EventTable
+
+SR = 1000
+
+
+def make_table(tmp_path):
+    table = EventTable()
+    rng = np.random.default_rng(0)
+    for name in ("a.wav", "b.wav"):
+        file_id = table.add_file(str(tmp_path / name), SR)
+        onsets = np.sort(rng.choice(100000, 200, replace=False))
+        # Round-number peaks hit float32 rounding at the query bounds
+        peaks = rng.choice([0.1, 0.3, 0.5, 0.7, 0.9], 200)
+        table.append_runs(file_id, onsets, onsets + 10, peaks, rng.integers(0, 2, 200))
+    return table
+
+
+def test_indexed_and_unindexed_peak_queries_agree(tmp_path):
+    table = make_table(tmp_path)
+    for min_peak, max_peak in ((0.7, None), (None, 0.3), (0.3, 0.7), (0.9, 0.9)):
+        # Without a file or time range the peak-sorted index is used
+        indexed = table.query(min_peak=min_peak, max_peak=max_peak)
+        masked = np.concatenate([table.query(str(tmp_path / name), min_peak=min_peak, max_peak=max_peak)
+                                 for name in ("a.wav", "b.wav")])
+        assert len(indexed) > 0
+        assert indexed.tolist() == masked.tolist()
+        peaks = table.column("peak")[indexed]
+        if min_peak is not None:
+            assert np.all(peaks >= np.float32(min_peak))
+        if max_peak is not None:
+            assert np.all(peaks <= np.float32(max_peak))
+
+
+def test_readding_a_file_replaces_its_events(tmp_path):
+    table = make_table(tmp_path)
+    relative = os.path.relpath(tmp_path / "a.wav")
+    table.add_result(relative, SR, [{"onset": 1.0, "offset": 1.01, "peak": 0.5, "channel": 0}])
+    assert len(table) == 201
+    assert table.counts_by_file() == {str(tmp_path / "a.wav"): 1, str(tmp_path / "b.wav"): 200}
+    assert len(table.query(min_peak=0.0)) == 201
+
+
+def test_save_and_load_keep_live_rows(tmp_path):
+    table = make_table(tmp_path)
+    table.add_result(str(tmp_path / "b.wav"), SR, [])
+    path = str(tmp_path / "pops.npz")
+    expected = table.events(table.query())
+    table.save(path)
+    loaded = EventTable.load(path)
+    assert len(loaded) == 200
+    assert loaded.events(loaded.query()) == expected
+    assert loaded.events(loaded.query(start=10, stop=20)) == table.events(table.query(start=10, stop=20))
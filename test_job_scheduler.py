@@ -0,0 +1,53 @@
+"""
+JobScheduler with a stand-in for the Tk root that runs after() callbacks
+when pumped.
+"""
+import time
+
+import pytest
+
+from job_scheduler import JobScheduler
+
+
+class FakeRoot:
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+
+    def pump(self, timeout=5.0):
+        # Run scheduled polls until none is left
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            callback = self.pending.pop(0)
+            callback()
+            time.sleep(0.001)
+
+
+def test_superseded_job_result_is_dropped():
+    root = FakeRoot()
+    jobs = JobScheduler(root)
+    results = []
+    jobs.submit("detect", lambda job: (time.sleep(0.05), "old")[1], on_done=results.append)
+    jobs.submit("detect", lambda job: "new", on_done=results.append)
+    root.pump()
+    jobs.shutdown()
+    assert results == ["new"]
+
+
+def test_polling_survives_a_failing_callback():
+    root = FakeRoot()
+    jobs = JobScheduler(root)
+    results = []
+
+    def fail(result):
+        raise RuntimeError("callback failed")
+
+    jobs.submit("first", lambda job: 1, on_done=fail)
+    jobs.submit("second", lambda job: (time.sleep(0.05), 2)[1], on_done=results.append)
+    with pytest.raises(RuntimeError):
+        root.pump()
+    root.pump()
+    jobs.shutdown()
+    assert results == [2]
@@ -0,0 +1,64 @@
+"""
+The live detector must give the events of pop_detection.detect_pops on the
+whole recording, whatever the block sizes.
+"""
+import numpy as np
+import pytest
+
+import pop_detection
+from capture_buffer import CaptureBuffer
+from live_detection import LiveDetectionWorker, OnlinePopDetector
+
+SR = 8000
+
+
+def make_signal(seconds, channels=1, seed=0):
+    # Quiet noise with clicks and short bursts scattered over every channel
+    rng = np.random.default_rng(seed)
+    y = (rng.standard_normal((int(seconds * SR), channels)) * 0.02).astype(np.float32)
+    for channel in range(channels):
+        for position in rng.choice(len(y) - SR // 10, int(seconds * 3), replace=False):
+            length = int(rng.integers(1, SR // 20))
+            y[position:position + length, channel] = rng.uniform(-1, 1, length)
+    return y[:, 0] if channels == 1 else y
+
+
+def test_online_detector_matches_detect_pops():
+    y = make_signal(30)
+    merge_gap = 0.02
+    detector = OnlinePopDetector(SR, 0.5, merge_gap)
+    events = []
+    for start in range(0, len(y), 80):  # 10 ms blocks
+        events.extend(detector.process(y[start:start + 80]))
+    events.extend(detector.flush())
+    assert events == pop_detection.detect_pops(y, SR, 0.5, merge_gap)
+
+
+def test_online_detector_with_irregular_blocks():
+    y = make_signal(10)
+    y[SR:SR + 50] = 0.9  # a pop cut by the 1-sample blocks below
+    merge_gap = 0.02
+    detector = OnlinePopDetector(SR, 0.5, merge_gap)
+    rng = np.random.default_rng(1)
+    edges = np.concatenate(([0], np.sort(rng.choice(len(y), 500, replace=False)), np.arange(SR, SR + 60),
+                            [len(y)]))
+    edges = np.unique(edges)
+    events = []
+    for start, stop in zip(edges[:-1].tolist(), edges[1:].tolist()):
+        events.extend(detector.process(y[start:stop]))
+    events.extend(detector.process(y[:0]))
+    events.extend(detector.flush())
+    assert events == pop_detection.detect_pops(y, SR, 0.5, merge_gap)
+
+
+def test_live_worker_matches_detect_pops():
+    y = make_signal(30, channels=2)
+    merge_gap = 0.02
+    capture = CaptureBuffer(SR, channels=2, chunk_duration=1.0)
+    worker = LiveDetectionWorker(capture, 0.5, merge_gap)
+    worker.start()
+    for start in range(0, len(y), 80):
+        capture.write(y[start:start + 80])
+        worker.notify()
+    worker.stop()
+    assert sorted(worker.drain()) == sorted(pop_detection.detect_pops(y, SR, 0.5, merge_gap))
@@ -0,0 +1,51 @@
+"""
+The parallel engine must give the events of pop_detection.detect_pops.
+"""
+import numpy as np
+import pytest
+
+import parallel_detection
+import pop_detection
+
+SR = 8000
+
+
+def make_signal(seconds, channels=1, seed=0):
+    # Quiet noise with clicks and short bursts scattered over every channel
+    rng = np.random.default_rng(seed)
+    y = (rng.standard_normal((int(seconds * SR), channels)) * 0.02).astype(np.float32)
+    for channel in range(channels):
+        for position in rng.choice(len(y) - SR // 10, int(seconds * 3), replace=False):
+            length = int(rng.integers(1, SR // 20))
+            y[position:position + length, channel] = rng.uniform(-1, 1, length)
+    return y[:, 0] if channels == 1 else y
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("mode", pop_detection.DETECTION_MODES)
+def test_parallel_matches_detect_pops(channels, mode):
+    if mode == "spectral":
+        pytest.importorskip("librosa")
+    y = make_signal(30, channels)
+    threshold = 0.4 if mode == "spectral" else 0.5
+    expected = pop_detection.detect_pops(y, SR, threshold, mode=mode)
+    assert parallel_detection.detect_pops_parallel(y, SR, threshold, mode=mode, workers=4) == expected
+
+
+def test_pops_straddling_task_boundaries(monkeypatch):
+    # Tiny tasks and sub-blocks put a boundary inside or next to every pop
+    monkeypatch.setattr(parallel_detection, "MIN_TASK_SAMPLES", 1)
+    monkeypatch.setattr(parallel_detection, "cache_bytes", lambda: 1024 * 9)
+    y = make_signal(5)
+    task_size, block_size = parallel_detection.plan_chunks(len(y), workers=8)
+    assert block_size == 1024 and task_size <= 2 * block_size
+    for merge_gap in (0.0, 0.05):
+        expected = pop_detection.detect_pops(y, SR, 0.5, merge_gap)
+        assert parallel_detection.detect_pops_parallel(y, SR, 0.5, merge_gap, workers=8) == expected
+
+
+def test_progress_reaches_one():
+    fractions = []
+    parallel_detection.detect_pops_parallel(make_signal(10, 2), SR, 0.5, on_progress=fractions.append, workers=4)
+    assert fractions == sorted(fractions)
+    assert fractions[-1] == pytest.approx(1.0)
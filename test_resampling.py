@@ -0,0 +1,65 @@
+"""
+Decimation modes and their streaming counterpart.
+"""
+import numpy as np
+import pytest
+
+import pop_detection
+import resampling
+
+NATIVE_SR = 48000
+TARGET_SR = 11025
+
+
+def make_signal(channels=None, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (NATIVE_SR * 2,) if channels is None else (NATIVE_SR * 2, channels)
+    y = (rng.standard_normal(shape) * 0.02).astype(np.float32)
+    for position in rng.choice(len(y) - 10, 40, replace=False):
+        y[position:position + int(rng.integers(1, 4))] = rng.uniform(-1, 1)  # clicks of 1-3 samples
+    return y
+
+
+def test_output_rate():
+    assert resampling.output_rate(NATIVE_SR, TARGET_SR, "stride") == 12000
+    assert resampling.output_rate(44100, 11025, "block_peak") == 11025
+    assert resampling.output_rate(44100, 16000, "block_peak") == 22050
+    assert resampling.output_rate(NATIVE_SR, TARGET_SR, "soxr_hq") == TARGET_SR
+    assert resampling.output_rate(NATIVE_SR, TARGET_SR, "none") == NATIVE_SR
+    assert resampling.output_rate(NATIVE_SR, None, "stride") == NATIVE_SR
+
+
+@pytest.mark.parametrize("channels", [None, 2])
+@pytest.mark.parametrize("mode", ["none", "stride", "block_peak"])
+def test_stream_decimator_matches_decimate(channels, mode):
+    y = make_signal(channels)
+    expected, sr = resampling.decimate(y, NATIVE_SR, TARGET_SR, mode)
+    decimator = resampling.StreamDecimator(NATIVE_SR, TARGET_SR, mode, channels)
+    assert decimator.sr == sr
+    # Piece lengths that are not multiples of the factor
+    edges = [0, 1, 1000, 1003, 30001, 77777, len(y)]
+    pieces = [decimator.process(y[a:b]) for a, b in zip(edges[:-1], edges[1:])]
+    flushed = decimator.flush()
+    if flushed is not None:
+        pieces.append(flushed)
+    np.testing.assert_array_equal(np.concatenate(pieces), expected)
+
+
+def test_block_peak_keeps_every_pop_peak():
+    y = make_signal()
+    threshold = 0.5
+    native = pop_detection.detect_pops(y, NATIVE_SR, threshold, 0.01)
+    assert len(native) > 10
+    reduced, sr = resampling.decimate(y, NATIVE_SR, TARGET_SR, "block_peak")
+    decimated = pop_detection.detect_pops(reduced, sr, threshold, 0.01)
+    assert [event.peak for event in decimated] == [event.peak for event in native]
+    factor = NATIVE_SR // sr
+    for native_event, event in zip(native, decimated):
+        assert native_event.onset - factor / NATIVE_SR <= event.onset <= native_event.onset
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        resampling.decimate(make_signal(), NATIVE_SR, TARGET_SR, "linear")
+    with pytest.raises(ValueError):
+        resampling.StreamDecimator(NATIVE_SR, TARGET_SR, "polyphase")
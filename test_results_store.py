@@ -0,0 +1,87 @@
+"""
+Incremental re-analysis: a grown file brought up to date from the results
+store must give the same events as analyzing it from scratch.
+"""
+import numpy as np
+import pytest
+
+import batch_analyzer
+import results_store
+
+SR = 8000
+
+
+def make_signal(seconds, channels=1, seed=0):
+    # Quiet noise with clicks and short bursts scattered over every channel
+    rng = np.random.default_rng(seed)
+    y = (rng.standard_normal((int(seconds * SR), channels)) * 0.02).astype(np.float32)
+    for channel in range(channels):
+        for position in rng.choice(len(y) - SR // 10, int(seconds * 3), replace=False):
+            length = int(rng.integers(1, SR // 20))
+            y[position:position + length, channel] = rng.uniform(-1, 1, length)
+    return y[:, 0] if channels == 1 else y
+
+
+class CollectingWriter:
+    def __init__(self):
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+
+def analyze_with_store(file_path, store, mono, mode, threshold):
+    writer = CollectingWriter()
+    counts = batch_analyzer.run_batch([file_path], writer, workers=1, threshold=threshold, mode=mode, store=store,
+                                      mono=mono)
+    return writer.results[0], counts
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("mode, threshold", [("amplitude", 0.5), ("spectral", 0.4)])
+def test_grown_file_matches_full_analysis(tmp_path, channels, mode, threshold):
+    sf = pytest.importorskip("soundfile")
+    if mode == "spectral":
+        pytest.importorskip("librosa")
+    y = make_signal(20, channels)
+    # Make a pop straddle the old end of the file on every channel
+    old_frames = 12 * SR
+    y[old_frames - 40:old_frames + 40] = 0.9
+    file_path = str(tmp_path / "growing.wav")
+    mono = channels == 1
+    store = results_store.ResultsStore(str(tmp_path / "results.sqlite"))
+    try:
+        sf.write(file_path, y[:old_frames], SR, subtype="FLOAT")
+        first, _ = analyze_with_store(file_path, store, mono, mode, threshold)
+        assert first["update"] == "analyze"
+
+        sf.write(file_path, y, SR, subtype="FLOAT")
+        updated, counts = analyze_with_store(file_path, store, mono, mode, threshold)
+        # Spectral results cannot be extended and are redone in full
+        assert counts.get("append" if mode == "amplitude" else "analyze") == 1
+
+        unchanged, counts = analyze_with_store(file_path, store, mono, mode, threshold)
+        assert counts.get("skip") == 1
+    finally:
+        store.close()
+
+    full = batch_analyzer.analyze_file(file_path, threshold=threshold, mode=mode, mono=mono)
+    assert len(full["events"]) > 0
+    assert updated["events"] == full["events"]
+    assert unchanged["events"] == full["events"]
+
+
+def test_resume_point_moves_back_across_channels():
+    sr = 1000
+    events = [{"onset": 0.2, "offset": 0.3, "channel": 0},
+              {"onset": 0.90, "offset": 0.98, "channel": 1},  # reaches the old end
+              {"onset": 0.85, "offset": 0.92, "channel": 0}]  # reaches the new resume point
+    start, kept = results_store.resume_point(events, 1000, sr, merge_gap=0.05)
+    assert start == 850
+    assert kept == [events[0]]
+
+
+def test_params_key_keeps_default_keys_stable():
+    key = results_store.params_key(0.4, 0.5, None, "amplitude")
+    assert key == '{"merge_gap": 0.5, "mode": "amplitude", "sr": null, "threshold": 0.4}'
+    assert results_store.params_key(0.4, 0.5, None, "amplitude", mono=False) != key
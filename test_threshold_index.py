@@ -0,0 +1,55 @@
+"""
+ThresholdIndex must give the events and counts of pop_detection.detect_pops.
+"""
+import io
+
+import numpy as np
+import pytest
+
+import pop_detection
+from threshold_index import ThresholdIndex
+
+SR = 8000
+
+
+def make_signal(seconds, channels=1, seed=0):
+    # Quiet noise with clicks and short bursts scattered over every channel
+    rng = np.random.default_rng(seed)
+    y = (rng.standard_normal((int(seconds * SR), channels)) * 0.02).astype(np.float32)
+    for channel in range(channels):
+        for position in rng.choice(len(y) - SR // 10, int(seconds * 3), replace=False):
+            length = int(rng.integers(1, SR // 20))
+            y[position:position + length, channel] = rng.uniform(-1, 1, length)
+    return y[:, 0] if channels == 1 else y
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_threshold_index_matches_detect_pops(channels):
+    y = make_signal(30, channels)
+    index = ThresholdIndex(y, SR)
+    for threshold in (0.1, 0.5, 0.95):
+        expected = pop_detection.detect_pops(y, SR, threshold)
+        assert index.detect_pops(threshold) == expected
+        assert index.count(threshold) == len(expected)
+
+
+def test_count_of_dense_pops_on_separate_channels():
+    # Clicks a few blocks apart, alternating between the channels
+    merge_gap = pop_detection.DEFAULT_MERGE_GAP
+    y = np.zeros((10 * SR, 2), dtype=np.float32)
+    spacing = int(merge_gap * SR) + 7
+    for i, position in enumerate(range(100, len(y) - 100, spacing)):
+        y[position, i % 2] = 0.8
+    index = ThresholdIndex(y, SR)
+    for threshold in (0.5, 0.79, 0.8):
+        assert index.count(threshold, merge_gap) == len(pop_detection.detect_pops(y, SR, threshold, merge_gap))
+    assert index.count(0.5) == len(range(100, len(y) - 100, spacing))
+
+
+def test_export_curve_uses_exact_counts():
+    y = make_signal(10)
+    index = ThresholdIndex(y, SR)
+    out = io.StringIO()
+    index.export_curve(out, [0.2, 0.6])
+    assert out.getvalue().splitlines() == ["threshold,pops"] + [
+        f"{threshold},{len(pop_detection.detect_pops(y, SR, threshold))}" for threshold in (0.2, 0.6)]
@@ -0,0 +1,34 @@
+"""
+Pop markers drawn by waveform_pyramid.plot_pop_markers.
+"""
+import numpy as np
+import pytest
+
+from waveform_pyramid import MARKER_SPACING, plot_pop_markers
+
+
+@pytest.fixture
+def ax():
+    figure = pytest.importorskip("matplotlib.figure")
+    return figure.Figure().add_subplot()
+
+
+def test_no_onsets_add_no_artist(ax):
+    assert plot_pop_markers(ax, [], 0, 10) is None
+    assert plot_pop_markers(ax, [11.0, 12.0], 0, 10) is None
+    assert len(ax.collections) == 0
+    assert ax.get_legend_handles_labels() == ([], [])
+
+
+def test_sparse_onsets_are_lines_and_dense_onsets_are_shaded(ax):
+    from matplotlib.collections import LineCollection, PolyCollection
+
+    lines = plot_pop_markers(ax, [1.0, 2.0, 3.0], 0, 10, width=1000)
+    assert isinstance(lines, LineCollection)
+    assert len(lines.get_segments()) == 3
+
+    onsets = np.linspace(0, 10, 1000 // MARKER_SPACING + 1)
+    shaded = plot_pop_markers(ax, onsets, 0, 10, width=1000)
+    assert isinstance(shaded, PolyCollection)
+    assert len(shaded.get_paths()) <= 1000
+    assert list(ax.collections) == [lines, shaded]
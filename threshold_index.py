@@ -0,0 +1,150 @@
+"""
+Threshold-sweep index over a loaded signal.
+
+One pass over the audio records the peak absolute amplitude of every block
+of every channel. Exact events for a threshold are produced by rescanning
+only the blocks whose peak exceeds it, with consecutive loud blocks scanned
+as one span, so the exact pop count is cheap enough for a live count next to
+a threshold slider. Counts are cached per threshold, and the
+count-vs-threshold curve exported for calibration is made of such counts.
+
+Events of a (frames, channels) signal are found per channel, like
+pop_detection.detect_pops; each channel only rescans its own loud blocks.
+
+Example:
+    python threshold_index.py recording.mp3 -o curve.csv
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+import instrumentation
+import pop_detection
+import resampling
+
+
+class ThresholdIndex:
+    def __init__(self, y, sr, block_duration=pop_detection.DEFAULT_MERGE_GAP):
+        self.y = y
+        self.sr = sr
+        self.block_size = max(1, int(block_duration * sr))
+
+        # Peak absolute amplitude of every block (a partial last block included), per channel
+        n_full = len(y) // self.block_size * self.block_size
+        self.block_peaks = []
+        for channel, channel_y in pop_detection.channel_views(y):
+            peaks = np.abs(channel_y[:n_full]).reshape(-1, self.block_size).max(axis=1) if n_full \
+                else np.zeros(0, dtype=np.float32)
+            if n_full < len(y):
+                peaks = np.append(peaks, np.abs(channel_y[n_full:]).max())
+            self.block_peaks.append(peaks)
+
+        # Blocks of each channel ordered from loudest to quietest, and the sorted peaks for counting
+        self.order = [np.argsort(peaks, kind="stable")[::-1] for peaks in self.block_peaks]
+        self.sorted_peaks = [np.sort(peaks) for peaks in self.block_peaks]
+        self._counts = {}  # (threshold, merge_gap) -> exact count
+
+    @property
+    def channels(self):
+        return len(self.block_peaks)
+
+    def blocks_above(self, threshold, channel=0):
+        return len(self.sorted_peaks[channel]) - np.searchsorted(self.sorted_peaks[channel], threshold, side="right")
+
+    def count(self, threshold, merge_gap=pop_detection.DEFAULT_MERGE_GAP):
+        """
+        Exact number of pops above threshold, len(detect_pops(...)), from a
+        rescan of the candidate blocks.
+        """
+        key = (float(threshold), float(merge_gap))
+        if key not in self._counts:
+            merge_gap_samples = int(merge_gap * self.sr)
+            self._counts[key] = sum(len(self.find_pop_runs(threshold, merge_gap_samples, channel)[0])
+                                    for channel in range(self.channels))
+        return self._counts[key]
+
+    def count_curve(self, thresholds=None, merge_gap=pop_detection.DEFAULT_MERGE_GAP):
+        """
+        Return (thresholds, exact counts) for many thresholds
+        (default: 0.00 to 1.00 in steps of 0.01).
+        """
+        if thresholds is None:
+            thresholds = np.round(np.arange(0, 1.001, 0.01), 2)
+        thresholds = np.asarray(thresholds)
+        return thresholds, np.array([self.count(threshold, merge_gap) for threshold in thresholds.tolist()],
+                                    dtype=np.int64)
+
+    def find_pop_runs(self, threshold, merge_gap_samples=0, channel=0):
+        """
+        Exact (onsets, offsets, peaks) runs for a threshold, identical to
+        pop_detection.find_pop_runs on the whole signal (on one channel of a
+        multichannel signal), but only the blocks whose peak exceeds the
+        threshold are scanned.
+        """
+        y = self.y if self.y.ndim == 1 else self.y[:, channel]
+        candidates = np.sort(self.order[channel][:self.blocks_above(threshold, channel)])
+        if len(candidates) == 0:
+            return pop_detection.merge_pop_runs([])
+
+        # Consecutive candidate blocks are scanned as one span
+        breaks = np.flatnonzero(np.diff(candidates) > 1)
+        span_starts = candidates[np.concatenate(([0], breaks + 1))] * self.block_size
+        span_stops = (candidates[np.concatenate((breaks, [len(candidates) - 1]))] + 1) * self.block_size
+        runs = [pop_detection.find_pop_runs(y[start:stop], threshold, merge_gap_samples, start)
+                for start, stop in zip(span_starts.tolist(), span_stops.tolist())]
+        return pop_detection.merge_pop_runs(runs, merge_gap_samples)
+
+    def detect_pops(self, threshold, merge_gap=pop_detection.DEFAULT_MERGE_GAP):
+        """
+        Same result as pop_detection.detect_pops(y, sr, threshold, merge_gap).
+        """
+        merge_gap_samples = int(merge_gap * self.sr)
+        with instrumentation.span("detect", mode="amplitude", indexed=True) as fields:
+            events = []
+            for channel in range(self.channels):
+                runs = self.find_pop_runs(threshold, merge_gap_samples, channel)
+                events.extend(pop_detection.runs_to_events(runs, self.sr, channel))
+            fields["events"] = len(events)
+        instrumentation.count("events_found", len(events))
+        return pop_detection.sort_events(events) if self.y.ndim == 2 else events
+
+    def export_curve(self, file, thresholds=None, merge_gap=pop_detection.DEFAULT_MERGE_GAP):
+        """
+        Write the exact count-vs-threshold curve as CSV to a path or open file.
+        """
+        thresholds, counts = self.count_curve(thresholds, merge_gap)
+        own_file = isinstance(file, str)
+        f = open(file, "w", newline="") if own_file else file
+        try:
+            writer = csv.writer(f)
+            writer.writerow(["threshold", "pops"])
+            writer.writerows(zip(thresholds.tolist(), counts.tolist()))
+        finally:
+            if own_file:
+                f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a pop count vs. threshold calibration curve.")
+    parser.add_argument("file", help="Audio file")
+    parser.add_argument("-o", "--output", default="-", help="CSV output path (default: stdout)")
+    parser.add_argument("--sr", type=int, help="Resample before indexing (default: native rate)")
+    parser.add_argument("--decimation", choices=resampling.DECIMATION_MODES, default=resampling.DEFAULT_DECIMATION,
+                        help="How --sr reduces the rate (block_peak keeps every pop's peak)")
+    parser.add_argument("--block", type=float, default=pop_detection.DEFAULT_MERGE_GAP,
+                        help="Index block length in seconds (affects speed only)")
+    parser.add_argument("--merge-gap", type=float, default=pop_detection.DEFAULT_MERGE_GAP,
+                        help="Merge pops closer than this many seconds")
+    parser.add_argument("--step", type=float, default=0.01, help="Threshold step")
+    args = parser.parse_args(argv)
+
+    y, sr = pop_detection.load_audio(args.file, sr=args.sr, decimation=args.decimation)
+    index = ThresholdIndex(y, sr, args.block)
+    thresholds = np.round(np.arange(0, 1 + args.step / 2, args.step), 6)
+    index.export_curve(sys.stdout if args.output == "-" else args.output, thresholds, args.merge_gap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Multi-resolution min/max envelope for waveform rendering.
+
+PeakPyramid is computed once per loaded signal. Level k holds the minimum and
+maximum of every block of 2**k samples, so any time range can be drawn at the
+resolution of the screen in O(pixels) while every peak stays visible (a plain
+stride like y[::100] can skip right over a short click).
+
+A (frames, channels) signal gets one envelope spanning all channels, built
+channel by channel from strided views.
+
+plot_pop_markers draws the detected pops with the same bounded cost: one
+artist and one legend entry however many pops there are, switching from
+individual lines to density shading when they get too close to tell apart.
+"""
+import numpy as np
+
+DEFAULT_BASE_LEVEL = 6  # Finest stored level: blocks of 64 samples
+MARKER_SPACING = 4  # Pixels per pop (on average) below which markers become density shading
+DENSITY_BIN_PIXELS = 2  # Width of a density shading column in pixels
+
+
+class PeakPyramid:
+    def __init__(self, y, base_level=DEFAULT_BASE_LEVEL):
+        self.y = y
+        self.base_level = base_level
+        self.mins = []  # mins[i] / maxs[i] belong to level base_level + i
+        self.maxs = []
+
+        # Build the finest level straight from the samples
+        block = 2 ** base_level
+        mins = maxs = None
+        for channel in range(1 if y.ndim == 1 else y.shape[1]):
+            channel_y = y if y.ndim == 1 else y[:, channel]
+            channel_mins, channel_maxs = self._reduce(channel_y, channel_y, block)
+            mins = channel_mins if mins is None else np.minimum(mins, channel_mins)
+            maxs = channel_maxs if maxs is None else np.maximum(maxs, channel_maxs)
+        self.mins.append(mins)
+        self.maxs.append(maxs)
+
+        # Each coarser level halves the previous one
+        while len(mins) > 1:
+            mins, maxs = self._reduce(mins, maxs, 2)
+            self.mins.append(mins)
+            self.maxs.append(maxs)
+
+    @staticmethod
+    def _reduce(mins, maxs, factor):
+        # Reduce consecutive groups of `factor` values; a partial last group is kept
+        n_full = len(mins) // factor * factor
+        new_mins = mins[:n_full].reshape(-1, factor).min(axis=1)
+        new_maxs = maxs[:n_full].reshape(-1, factor).max(axis=1)
+        if n_full < len(mins):
+            new_mins = np.append(new_mins, mins[n_full:].min())
+            new_maxs = np.append(new_maxs, maxs[n_full:].max())
+        return new_mins, new_maxs
+
+    def envelope(self, start=0, stop=None, width=1000):
+        """
+        Return (sample_indices, mins, maxs) describing y[start:stop] with at
+        most `width` min/max pairs. Short ranges are returned sample-exact.
+        """
+        stop = len(self.y) if stop is None else min(stop, len(self.y))
+        start = max(0, min(start, stop))
+        samples_per_bin = (stop - start) / max(1, width)
+
+        # Zoomed in far enough to show raw samples
+        if samples_per_bin < 2 ** self.base_level:
+            segment = np.asarray(self.y[start:stop])
+            if segment.ndim == 2:
+                return np.arange(start, stop), segment.min(axis=1), segment.max(axis=1)
+            return np.arange(start, stop), segment, segment
+
+        # Coarsest level that still has at least one block per pixel
+        level = min(int(np.log2(samples_per_bin)), self.base_level + len(self.mins) - 1)
+        block = 2 ** level
+        mins = self.mins[level - self.base_level][start // block:-(-stop // block)]
+        maxs = self.maxs[level - self.base_level][start // block:-(-stop // block)]
+
+        # Fold the (at most 2 * width) blocks into exactly width bins
+        n_bins = min(width, len(mins))
+        bin_starts = np.linspace(0, len(mins), n_bins, endpoint=False).astype(np.int64)
+        indices = (start // block + bin_starts) * block
+        return indices, np.minimum.reduceat(mins, bin_starts), np.maximum.reduceat(maxs, bin_starts)
+
+
+def plot_envelope(ax, pyramid, sr, width=1000, start=0, stop=None, offset=0, **plot_kwargs):
+    """
+    Draw the envelope of y[start:stop] on a matplotlib axis as a single line
+    that alternates between each bin's minimum and maximum. offset is the
+    sample index of y[0] in the full recording.
+    """
+    indices, mins, maxs = pyramid.envelope(start, stop, width)
+    times = np.repeat((indices + offset) / sr, 2)
+    values = np.column_stack((mins, maxs)).ravel()
+    return ax.plot(times, values, **plot_kwargs)
+
+
+def plot_pop_markers(ax, onsets, start, stop, width=1000, color='r', label='Pop Detected'):
+    """
+    Mark pop onsets (seconds) between start and stop seconds on a matplotlib
+    axis as a single collection spanning the axis height: a dashed line per
+    pop while there are fewer than width / MARKER_SPACING of them, otherwise
+    shaded columns whose opacity follows the number of pops in them. At most
+    about `width` primitives are drawn either way. Returns the collection,
+    or None (and adds nothing, so no empty legend entry) without onsets in range.
+    """
+    from matplotlib.collections import LineCollection, PolyCollection
+    from matplotlib.colors import to_rgba
+
+    onsets = np.asarray(onsets, dtype=np.float64)
+    onsets = onsets[(onsets >= start) & (onsets <= stop)]
+    if len(onsets) == 0:
+        return None
+    transform = ax.get_xaxis_transform()  # x in seconds, y from bottom (0) to top (1) of the axis
+
+    if len(onsets) <= width // MARKER_SPACING:
+        segments = np.zeros((len(onsets), 2, 2))
+        segments[:, :, 0] = onsets[:, None]
+        segments[:, 1, 1] = 1
+        markers = LineCollection(segments, colors=color, linestyles='--', transform=transform, label=label)
+    else:
+        counts, edges = np.histogram(onsets, max(1, width // DENSITY_BIN_PIXELS), (start, stop))
+        occupied = np.flatnonzero(counts)
+        left, right = edges[occupied], edges[occupied + 1]
+        verts = np.zeros((len(occupied), 4, 2))
+        verts[:, :, 0] = np.column_stack((left, left, right, right))
+        verts[:, 1:3, 1] = 1
+        # Even a single pop stays visible; the busiest column is the most opaque
+        colors = np.tile(to_rgba(color), (len(occupied), 1))
+        colors[:, 3] = 0.15 + 0.6 * np.sqrt(counts[occupied] / counts.max())
+        # Behind the waveform, which the shading would otherwise hide
+        markers = PolyCollection(verts, facecolors=colors, edgecolors='none', transform=transform, zorder=0,
+                                 label=f'{label} (density)')
+    # The markers span the axis; they must not stretch the amplitude limits
+    ax.add_collection(markers, autolim=False)
+    return markers